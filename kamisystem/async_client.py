@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡密授权管理系统异步客户端
+供代替大量下游用户验证卡密的网关等高并发场景使用，需要安装 aiohttp
+"""
+
+import asyncio
+import time
+
+from client_example import (CircuitBreaker, CircuitOpenError, RETRY_STATUS, RetryCacheMixin,
+                            batch_results, error_result, status_result, success_result)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+class AsyncKamiClient(RetryCacheMixin):
+    """asyncio 版 KamiClient，接口与返回格式相同（validate_card、validate_many、get_card_status、check_service_health）
+    
+    - 所有请求共用一个 aiohttp 连接池（pool_size 个 keep-alive 连接），timeout 为 (连接超时, 读取超时) 秒
+    - 同时发出的请求不超过 max_concurrency 个，其余排队等待，不占用连接也不会触发超时
+    - 同一 (卡密, 机器码) 的验证、同一卡密的状态查询正在进行时，新的调用等待同一个请求的结果，
+      不重复请求服务器；coalesced 为因此少发的请求数
+    - 重试、退避与熔断规则与 KamiClient 相同，默认关闭，熔断器由所有调用共用
+    - cache_margin 不为 None 时，验证成功的结果缓存到卡密过期前 cache_margin 秒，最多 max_cached 条
+    
+    不支持离线授权令牌（网关应直接信任服务器的验证结果）。
+    需要在事件循环中使用，结束时调用 close()，或使用 async with。
+    """
+    
+    def __init__(self, api_url="http://localhost:5000/api", timeout=(3, 10), pool_size=100,
+                 max_concurrency=100, retries=0, backoff_base=0.5, backoff_cap=30,
+                 breaker_threshold=0, breaker_cooldown=30, breaker_max_cooldown=120,
+                 cache_margin=None, max_cached=100000):
+        if aiohttp is None:
+            raise ImportError("AsyncKamiClient 需要安装 aiohttp 包")
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown, breaker_max_cooldown)
+        self.cache_margin = cache_margin
+        self.max_cached = max_cached
+        self._results = {}
+        self._inflight = {}
+        # 连接池与信号量在首次请求时于当前事件循环中创建
+        self._session = None
+        self._semaphore = None
+        self.coalesced = 0
+        self.clock = time.time
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(connect=connect, sock_read=read),
+                headers={'User-Agent': 'AsyncKamiClient/1.0'}
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+    
+    async def _send(self, method, path, **kwargs):
+        """发送一次请求，返回 (HTTP 状态码, Retry-After, 响应 JSON)，响应不是 JSON 时为 None"""
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.request(method, f"{self.api_url}{path}", **kwargs) as response:
+                try:
+                    result = await response.json(content_type=None)
+                except ValueError:
+                    result = None
+                return response.status, response.headers.get('Retry-After'), result
+    
+    async def _request(self, method, path, **kwargs):
+        """发送请求：熔断、超时与退避重试，返回最后一次的 (HTTP 状态码, 响应 JSON)
+        
+        每次请求失败都计入熔断器，熔断后不再重试。没有得到响应时抛出最后一次的网络异常，
+        熔断期间抛出 CircuitOpenError。
+        """
+        status = retry_after = result = error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1, status, retry_after))
+            if not self.breaker.allow():
+                if status is None:
+                    raise error or CircuitOpenError("验证服务暂时不可用（熔断中）")
+                return status, result
+            try:
+                status, retry_after, result = await self._send(method, path, **kwargs)
+                error = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, error = None, e
+            if status is not None and status not in RETRY_STATUS:
+                self.breaker.record(True)
+                return status, result
+            self.breaker.record(False)
+        
+        if status is None:
+            raise error
+        return status, result
+    
+    async def _coalesce(self, key, factory):
+        """同一 key 的调用共用一个进行中的请求，返回结果的副本"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # 某个调用被取消时不影响其他等待同一请求的调用
+        return dict(await asyncio.shield(task))
+    
+    async def validate_card(self, card_code, machine_code):
+        """验证卡密，返回格式与 KamiClient.validate_card 相同；网关代替下游用户验证，必须传入机器码"""
+        cached = self._cached_result(card_code, machine_code)
+        if cached:
+            return cached
+        return await self._coalesce(('validate', card_code, machine_code),
+                                    lambda: self._validate(card_code, machine_code))
+    
+    async def _validate(self, card_code, machine_code):
+        try:
+            status, result = await self._request('POST', "/validate",
+                                                 json={"code": card_code, "machine_code": machine_code})
+            result = result or {}
+            if status == 200 and result.get("status") == "success":
+                validated = success_result(result, machine_code)
+                self._cache_result(card_code, machine_code, validated)
+                return validated
+            # 服务器明确拒绝时丢弃缓存结果
+            self._forget_result(card_code, machine_code)
+            return error_result(result.get("message", "验证失败"), status)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            return error_result(f"网络错误: {str(e) or type(e).__name__}", -1)
+        except Exception as e:
+            return error_result(f"未知错误: {str(e)}", -2)
+    
+    async def validate_many(self, cards):
+        """批量验证卡密，cards 为 (卡密, 机器码) 元组列表，返回与输入顺序一致的结果列表"""
+        items = [{"code": card_code, "machine_code": machine_code} for card_code, machine_code in cards]
+        try:
+            status, result = await self._request('POST', "/validate/batch", json={"items": items})
+            result = result or {}
+            if status != 200 or result.get("status") != "success":
+                return [error_result(result.get("message", "验证失败"), status) for _ in items]
+            
+            return batch_results(items, result)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            return [error_result(f"网络错误: {str(e) or type(e).__name__}", -1) for _ in items]
+        except Exception as e:
+            return [error_result(f"未知错误: {str(e)}", -2) for _ in items]
+    
+    async def get_card_status(self, card_code):
+        """获取卡密状态"""
+        return await self._coalesce(('status', card_code), lambda: self._status(card_code))
+    
+    async def _status(self, card_code):
+        try:
+            status, result = await self._request('GET', f"/status/{card_code}")
+            result = result or {}
+            if status == 200 and result.get("status") == "success":
+                return status_result(result)
+            return error_result(result.get("message", "获取状态失败"), status)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            return error_result(f"网络错误: {str(e) or type(e).__name__}", -1)
+        except Exception as e:
+            return error_result(f"未知错误: {str(e)}", -2)
+    
+    async def check_service_health(self):
+        """检查服务健康状态（只探测一次，不重试也不计入熔断）"""
+        try:
+            status, _, _ = await self._send('GET', "/health")
+            return status == 200
+        except Exception:
+            return False
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+服务中断后客户端群的重试模拟
+--clients 个客户端每隔 --interval 秒验证一次（起始时间随机错开），服务器在 --outage 秒内不可用。
+验证失败后应用每隔 1 秒重新调用，比较两种客户端在中断期间与恢复后服务器收到的请求数:
+    固定间隔: 每次调用只发一个请求，失败后 1 秒重试（没有退避与熔断）
+    退避+熔断: client_example.KamiClient 的策略，调用内按带抖动的指数退避重试，
+               连续 --threshold 次请求失败后熔断，熔断期间的调用不发送请求
+
+退避时间与熔断器使用 KamiClient 的实现，时间为模拟时钟。
+
+示例:
+    python benchmarks/bench_client_recovery.py --clients 10000 --outage 60
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+from collections import Counter
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+
+APP_RETRY = 1.0
+
+def simulate(args, resilient):
+    """返回 (中断期间的请求数, 每秒请求数 Counter, 全部客户端恢复所需秒数，模拟结束时仍未恢复为 None)"""
+    from client_example import KamiClient, CircuitBreaker
+    
+    rng = random.Random(args.seed)
+    now = [0.0]
+    client = KamiClient(retries=args.retries, backoff_base=args.backoff_base, backoff_cap=args.backoff_cap)
+    breakers = [CircuitBreaker(args.threshold, args.cooldown, args.max_cooldown, clock=lambda: now[0])
+                for _ in range(args.clients)]
+    outage_start = args.interval
+    outage_end = outage_start + args.outage
+    
+    # 事件: (时间, 客户端, 本次调用内的第几次尝试)
+    events = [(rng.uniform(0, args.interval), i, 0) for i in range(args.clients)]
+    heapq.heapify(events)
+    per_second = Counter()
+    during_outage = 0
+    failing = set()
+    recovered_at = outage_end
+    
+    while events:
+        at, i, attempt = heapq.heappop(events)
+        if at > outage_end + args.tail:
+            break
+        now[0] = at
+        if resilient and not breakers[i].allow():
+            # 熔断中，本次调用不再发送请求
+            heapq.heappush(events, (at + APP_RETRY, i, 0))
+            continue
+        
+        per_second[int(at)] += 1
+        if outage_start <= at < outage_end:
+            during_outage += 1
+            failing.add(i)
+            if resilient:
+                breakers[i].record(False)
+                if attempt < args.retries:
+                    heapq.heappush(events, (at + client._backoff(attempt), i, attempt + 1))
+                    continue
+            heapq.heappush(events, (at + APP_RETRY, i, 0))
+            continue
+        
+        if resilient:
+            breakers[i].record(True)
+        if i in failing:
+            failing.discard(i)
+            if not failing:
+                recovered_at = at
+        heapq.heappush(events, (at + args.interval, i, 0))
+    
+    return during_outage, per_second, None if failing else recovered_at - outage_end
+
+def main():
+    parser = argparse.ArgumentParser(description="服务中断后客户端群的重试模拟")
+    parser.add_argument("--clients", type=int, default=10000, help="客户端数量")
+    parser.add_argument("--interval", type=float, default=60, help="每个客户端的验证间隔（秒）")
+    parser.add_argument("--outage", type=float, default=60, help="服务器不可用的时长（秒）")
+    parser.add_argument("--tail", type=float, default=300, help="恢复后继续模拟的时长（秒）")
+    parser.add_argument("--retries", type=int, default=3, help="KamiClient retries")
+    parser.add_argument("--backoff-base", type=float, default=0.5, help="KamiClient backoff_base")
+    parser.add_argument("--backoff-cap", type=float, default=30, help="KamiClient backoff_cap")
+    parser.add_argument("--threshold", type=int, default=5, help="KamiClient breaker_threshold")
+    parser.add_argument("--cooldown", type=float, default=30, help="KamiClient breaker_cooldown")
+    parser.add_argument("--max-cooldown", type=float, default=120, help="KamiClient breaker_max_cooldown")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+    
+    random.seed(args.seed)
+    steady = args.clients / args.interval
+    outage_end = int(args.interval + args.outage)
+    print(f"客户端 {args.clients} 个, 验证间隔 {args.interval} 秒（平时约 {steady:.0f} 请求/秒）, "
+          f"中断 {args.outage} 秒")
+    print(f"{'策略':<10}{'中断期间请求':>12}{'中断期间峰值/秒':>16}{'恢复后峰值/秒':>14}{'全部恢复耗时':>12}")
+    for name, resilient in (('固定间隔', False), ('退避+熔断', True)):
+        during, per_second, recovery = simulate(args, resilient)
+        outage_peak = max((count for second, count in per_second.items()
+                           if args.interval <= second < outage_end), default=0)
+        after_peak = max((count for second, count in per_second.items() if second >= outage_end), default=0)
+        recovery = f"{recovery:.1f} 秒" if recovery is not None else f"> {args.tail:.0f} 秒"
+        print(f"{name:<10}{during:>16}{outage_peak:>18}{after_peak:>16}{recovery:>16}")
+
+if __name__ == "__main__":
+    main()
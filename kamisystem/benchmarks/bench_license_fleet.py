@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+离线授权令牌的客户端群模拟
+模拟 --clients 个客户端在 --duration 秒内每隔 --interval 秒检查一次授权（起始时间随机错开），
+比较不使用令牌（每次检查都请求服务器）与使用令牌（本地校验，接近到期才请求服务器）时服务器收到的验证请求数。
+
+客户端为 client_example.KamiClient，服务器以进程内的模拟接口代替，时间为模拟时钟；
+令牌由 utils.license_token.LicenseSigner 签发，客户端使用真实的签名校验。
+
+示例:
+    python benchmarks/bench_license_fleet.py --clients 200 --duration 7200 --interval 60 --ttl 3600
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'web'))
+
+class SimClock:
+    def __init__(self, start):
+        self.now = start
+    
+    def __call__(self):
+        return self.now
+
+class SimResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+    
+    def json(self):
+        return self._payload
+
+class SimServer:
+    """模拟 /api/validate：卡密在首次请求时激活，按请求中的 token 字段签发令牌"""
+    
+    def __init__(self, signer, clock, period):
+        self.signer = signer
+        self.clock = clock
+        self.period = period
+        self.activated = {}
+        self.requests = 0
+    
+    def post(self, url, json=None, **kwargs):
+        self.requests += 1
+        now = datetime.utcfromtimestamp(self.clock())
+        expire_at = self.activated.setdefault(json['code'], now + self.period)
+        payload = {
+            'status': 'success',
+            'message': '授权成功',
+            'expire_at': expire_at.isoformat(),
+            'remaining_hours': round((expire_at - now).total_seconds() / 3600, 2)
+        }
+        if json.get('token'):
+            payload['license_token'] = self.signer.issue(json['code'], json['machine_code'], expire_at, now=now)
+        return SimResponse(200, payload)
+
+def simulate(args, signer, public_keys):
+    """返回 (服务器请求数, 检查次数, 本地校验成功次数)"""
+    from client_example import KamiClient
+    
+    rng = random.Random(args.seed)
+    clock = SimClock(time.time())
+    start = clock.now
+    server = SimServer(signer, clock, timedelta(seconds=args.period))
+    
+    clients = []
+    checks = []
+    for i in range(args.clients):
+        # 只比较令牌的效果，关闭验证结果缓存
+        client = KamiClient(license_keys=public_keys, refresh_margin=args.margin, cache_margin=None)
+        client.session = server
+        client.clock = clock
+        clients.append(client)
+        heapq.heappush(checks, (start + rng.uniform(0, args.interval), i))
+    
+    total = offline = 0
+    while checks:
+        at, i = heapq.heappop(checks)
+        if at - start > args.duration:
+            break
+        clock.now = at
+        result = clients[i].validate_card(f"FLEET-{i:08d}", f"MACHINE-{i:08d}")
+        if not result['success']:
+            raise RuntimeError(result)
+        total += 1
+        offline += bool(result.get('offline'))
+        heapq.heappush(checks, (at + args.interval, i))
+    return server.requests, total, offline
+
+def main():
+    parser = argparse.ArgumentParser(description="离线授权令牌的客户端群模拟")
+    parser.add_argument("--clients", type=int, default=200, help="客户端数量")
+    parser.add_argument("--duration", type=int, default=7200, help="模拟时长（秒）")
+    parser.add_argument("--interval", type=float, default=60, help="每个客户端的检查间隔（秒）")
+    parser.add_argument("--ttl", type=int, default=3600, help="令牌有效期 LICENSE_TOKEN_TTL（秒）")
+    parser.add_argument("--margin", type=int, default=300, help="客户端在令牌到期前多少秒重新请求服务器")
+    parser.add_argument("--period", type=int, default=3 * 3600, help="卡密激活后的有效期（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from utils.license_token import LicenseSigner, generate_key
+    
+    private, public = generate_key()
+    signer = LicenseSigner()
+    signer.configure(f"bench:{private}", 'bench', args.ttl)
+    
+    print(f"客户端 {args.clients} 个, 模拟 {args.duration} 秒, 检查间隔 {args.interval} 秒, "
+          f"令牌有效期 {args.ttl} 秒, 提前 {args.margin} 秒刷新")
+    
+    baseline, checks, _ = simulate(args, signer, None)
+    with_tokens, _, offline = simulate(args, signer, {'bench': public})
+    print(f"{'模式':<10}{'检查次数':>10}{'服务器请求':>12}{'本地校验':>10}")
+    print(f"{'每次请求':<10}{checks:>12}{baseline:>14}{0:>12}")
+    print(f"{'离线令牌':<10}{checks:>12}{with_tokens:>14}{offline:>12}")
+    print(f"服务器请求减少 {1 - with_tokens / baseline:.1%}（{baseline / with_tokens:.1f} 倍）")
+    
+    # 单次签发与校验的耗时
+    from client_example import KamiClient
+    now = datetime.utcnow()
+    token = signer.issue('FLEET-00000000', 'MACHINE-00000000', now + timedelta(hours=3), now=now)
+    client = KamiClient(license_keys={'bench': public})
+    number = 2000
+    sign = min(timeit.repeat(lambda: signer.issue('FLEET-00000000', 'MACHINE-00000000',
+                                                  now + timedelta(hours=3), now=now),
+                             number=number, repeat=3)) / number * 1e6
+    verify = min(timeit.repeat(lambda: client.verify_license(token, 'FLEET-00000000', 'MACHINE-00000000'),
+                               number=number, repeat=3)) / number * 1e6
+    print(f"服务端签发 {sign:.1f} µs/次（同一卡密在有效期前一半内复用令牌），客户端校验 {verify:.1f} µs/次, "
+          f"令牌长度 {len(token)} 字节")
+
+if __name__ == "__main__":
+    main()
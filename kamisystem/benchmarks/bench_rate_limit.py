@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+限流微基准测试
+测量每次请求的限流开销:
+    take       单个令牌桶取令牌（热点键）
+    check      按 IP + 机器码检查，键在 --keys 个客户端之间轮换
+    context    仅创建请求上下文
+    parse      请求上下文 + 解析 JSON 请求体（基线：解析结果会被缓存，视图函数本来就要解析）
+    throttle   基线 + api 蓝图的 before_request 钩子，不访问数据库
+    limited    基线 + 已被限流的请求（构造 429 响应）
+钩子一列为减去 parse 基线后的限流开销。
+
+示例:
+    python benchmarks/bench_rate_limit.py --number 100000 --keys 50000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+def build_cases(keys):
+    """返回 {场景: 函数}"""
+    # 钩子不访问数据库，只需要一个可以创建引擎的地址
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_rate_limit.db'))
+    # 限流默认关闭，测量的是开启后的开销
+    os.environ['RATE_LIMIT_ENABLED'] = 'True'
+    from app import create_app
+    from flask import request
+    from routes.api import throttle
+    from utils.rate_limit import MemoryTokenBuckets, RateLimiter, rate_limiter
+    
+    store = MemoryTokenBuckets(max_keys=keys * 2)
+    
+    # 令牌补充足够快，测量的是放行路径
+    limiter = RateLimiter(MemoryTokenBuckets(max_keys=keys * 2))
+    limiter.enabled = True
+    limiter.ip_rate = limiter.ip_burst = limiter.machine_rate = limiter.machine_burst = 1e9
+    clients = itertools.cycle([(f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', f'MACHINE-{i:08d}')
+                               for i in range(keys)])
+    
+    app = create_app()
+    body = json.dumps({'code': 'BENCH-0000000001', 'machine_code': 'BENCH-MACHINE'})
+    
+    def request_context(hook=None, rate=None):
+        def run():
+            if rate is not None:
+                rate_limiter.ip_rate = rate_limiter.ip_burst = rate
+                rate_limiter.machine_rate = rate_limiter.machine_burst = rate
+            with app.test_request_context('/api/validate', method='POST', data=body,
+                                          content_type='application/json'):
+                if hook:
+                    return hook()
+        return run
+    
+    return {
+        'take': lambda: store.take('ip:127.0.0.1', 1e9, 1e9),
+        'check': lambda: limiter.check(*next(clients)),
+        'context': request_context(),
+        'parse': request_context(lambda: request.get_json(silent=True)),
+        'throttle': request_context(throttle, 1e9),
+        'limited': request_context(throttle, 1e-9)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="限流微基准测试")
+    parser.add_argument("--number", type=int, default=100000, help="每轮执行次数")
+    parser.add_argument("--repeat", type=int, default=5, help="轮数，取最快一轮")
+    parser.add_argument("--keys", type=int, default=50000, help="check 场景轮换的客户端数量")
+    args = parser.parse_args()
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    results = {}
+    print(f"{'场景':<10}{'每次(µs)':>10}{'钩子(µs)':>10}")
+    for name, func in build_cases(args.keys).items():
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number * 1e6
+        results[name] = best
+        hook = f"{best - results['parse']:>10.2f}" if name in ('throttle', 'limited') else ''
+        print(f"{name:<12}{best:>10.2f}{hook}")
+
+if __name__ == "__main__":
+    main()
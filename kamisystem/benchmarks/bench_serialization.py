@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+响应序列化微基准测试
+比较验证成功响应与状态查询响应的单次构造 + 编码耗时:
+    before  pytz 时区转换 + 标准库 json（Flask 默认编码器）
+    after   固定偏移时区转换 + FastJSONProvider（安装了 orjson 时使用 orjson）
+    cached  after 的基础上使用缓存中预先格式化的过期时间（缓存命中路径）
+
+示例:
+    python benchmarks/bench_serialization.py --number 100000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web'))
+
+def build_cases():
+    """返回 {场景: {版本: 函数}}"""
+    import pytz
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from models import CardStatus
+    from utils.serialization import FastJSONProvider, shanghai_isoformat
+    from utils.validation import success_payload, status_payload
+    
+    app = Flask(__name__)
+    default_json = DefaultJSONProvider(app)
+    fast_json = FastJSONProvider(app)
+    pytz_shanghai = pytz.timezone('Asia/Shanghai')
+    
+    now = datetime.utcnow()
+    used_at = now - timedelta(hours=1)
+    expire_at = used_at + timedelta(hours=3)
+    created_at = now - timedelta(days=1)
+    expire_at_iso = shanghai_isoformat(expire_at)
+    
+    def pytz_isoformat(dt):
+        if dt is None:
+            return None
+        return dt.replace(tzinfo=pytz.UTC).astimezone(pytz_shanghai).isoformat()
+    
+    def success_before():
+        payload = {
+            'status': 'success',
+            'message': '授权成功',
+            'expire_at': pytz_isoformat(expire_at),
+            'remaining_hours': round((expire_at - now).total_seconds() / 3600, 2)
+        }
+        return default_json.dumps(payload)
+    
+    def status_before():
+        payload = {
+            'status': 'success',
+            'data': {
+                'full_code': 'BENCH-0000000001',
+                'status': CardStatus.ACTIVE.value,
+                'created_at': pytz_isoformat(created_at),
+                'used_at': pytz_isoformat(used_at),
+                'expire_at': pytz_isoformat(expire_at),
+                'machine_code': 'BENCH-MACHINE',
+                'remaining_hours': round((expire_at - now).total_seconds() / 3600, 2)
+            }
+        }
+        return default_json.dumps(payload)
+    
+    return {
+        'validate': {
+            'before': success_before,
+            'after': lambda: fast_json.dumps(success_payload(expire_at, now)),
+            'cached': lambda: fast_json.dumps(success_payload(expire_at, now, expire_at_iso))
+        },
+        'status': {
+            'before': status_before,
+            'after': lambda: fast_json.dumps(status_payload(
+                'BENCH-0000000001', CardStatus.ACTIVE, created_at, used_at, expire_at, 'BENCH-MACHINE', now))
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化微基准测试")
+    parser.add_argument("--number", type=int, default=100000, help="每轮执行次数")
+    parser.add_argument("--repeat", type=int, default=5, help="轮数，取最快一轮")
+    args = parser.parse_args()
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from utils.serialization import orjson
+    print(f"JSON 编码器: {'orjson ' + orjson.__version__ if orjson else '标准库 json'}")
+    print(f"{'场景':<10}{'版本':<8}{'每次(µs)':>10}{'加速':>8}")
+    
+    for name, versions in build_cases().items():
+        baseline = None
+        for version, func in versions.items():
+            best = min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number * 1e6
+            baseline = baseline or best
+            print(f"{name:<12}{version:<10}{best:>10.2f}{baseline / best:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
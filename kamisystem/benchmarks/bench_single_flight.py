@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+同一卡密并发验证的请求合并（single-flight）测试
+模拟热门客户端重启：对 --cards 个未使用的卡密，每个卡密同时发出 --burst 个相同的验证请求
+（同一卡密、同一机器码），分别在关闭与开启请求合并时统计数据库语句数、非 200 响应数与耗时。
+Flask 服务以线程并发调用测试客户端，ASGI 服务以协程并发直接调用应用，均在进程内完成。
+
+注意: 测试会重建目标数据库中的表，请使用单独的测试库
+
+示例:
+    python benchmarks/bench_single_flight.py --cards 50 --burst 100
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from bench_async import asgi_request
+from load_test import seed_cards
+
+def count_statements(engine):
+    """统计引擎执行的 SQL 语句数，返回计数列表（便于在回调中修改）"""
+    from sqlalchemy import event
+    counter = [0]
+    
+    def before_cursor_execute(*args):
+        counter[0] += 1
+    
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+def run_flask(app, codes, burst):
+    """每个卡密由 burst 个线程同时验证，返回非 200 响应数"""
+    failures = [0]
+    lock = threading.Lock()
+    
+    def worker(barrier, code):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/api/validate', json={'code': code, 'machine_code': 'BURST-MACHINE'})
+        if response.status_code != 200:
+            with lock:
+                failures[0] += 1
+    
+    for code in codes:
+        barrier = threading.Barrier(burst)
+        threads = [threading.Thread(target=worker, args=(barrier, code)) for _ in range(burst)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return failures[0]
+
+async def run_asgi(app, codes, burst):
+    """每个卡密由 burst 个协程同时验证，返回非 200 响应数"""
+    failures = 0
+    for code in codes:
+        statuses = await asyncio.gather(*(
+            asgi_request(app, 'POST', '/api/validate', {'code': code, 'machine_code': 'BURST-MACHINE'})
+            for _ in range(burst)
+        ))
+        failures += sum(1 for status in statuses if status != 200)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="同一卡密并发验证的请求合并测试")
+    parser.add_argument("--database-url", help="数据库地址，默认使用临时 SQLite 文件")
+    parser.add_argument("--cards", type=int, default=50, help="测试的卡密数量")
+    parser.add_argument("--burst", type=int, default=100, help="每个卡密同时发出的验证请求数")
+    args = parser.parse_args()
+    
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_single_flight.db')
+    os.environ['DATABASE_URL'] = database_url
+    # 请求都来自同一 IP 与机器码，关闭限流
+    os.environ['RATE_LIMIT_ENABLED'] = 'False'
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from app import create_app
+    from asgi_api import create_asgi_app, ValidationService
+    from models import db, Card, CardStatus
+    from utils.card_cache import card_cache
+    from utils.validation import validation_flight
+    
+    flask_app = create_app()
+    asgi_app = create_asgi_app(ValidationService(database_url, pool_size=args.burst))
+    
+    async def asgi_round(codes, enabled):
+        await asgi_app.service.startup()
+        validation_flight.enabled = enabled
+        try:
+            counter = count_statements(asgi_app.service.engine.sync_engine)
+            start = time.perf_counter()
+            failures = await run_asgi(asgi_app, codes, args.burst)
+            return counter[0], failures, time.perf_counter() - start
+        finally:
+            await asgi_app.service.shutdown()
+    
+    def flask_round(codes, enabled):
+        validation_flight.enabled = enabled
+        with flask_app.app_context():
+            counter = count_statements(db.engine)
+        start = time.perf_counter()
+        failures = run_flask(flask_app, codes, args.burst)
+        return counter[0], failures, time.perf_counter() - start
+    
+    print(f"卡密 {args.cards} 个, 每个卡密同时 {args.burst} 个验证请求")
+    print(f"{'服务':<8}{'请求合并':<8}{'SQL 语句':>10}{'语句/请求':>10}{'非 200':>8}{'耗时(秒)':>10}{'合并请求':>10}")
+    total = args.cards * args.burst
+    runs = (('Flask', flask_round), ('ASGI', lambda codes, enabled: asyncio.run(asgi_round(codes, enabled))))
+    for name, run in runs:
+        for enabled in (False, True):
+            with flask_app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+                db.drop_all()
+                db.create_all()
+                pools = seed_cards(db, Card, CardStatus, args.cards * 2)
+            card_cache.clear()
+            coalesced = validation_flight.coalesced
+            statements, failures, elapsed = run([code for code, _ in pools['unused']], enabled)
+            print(f"{name:<8}{'开启' if enabled else '关闭':<8}{statements:>12}{statements / total:>12.2f}"
+                  f"{failures:>10}{elapsed:>12.2f}{validation_flight.coalesced - coalesced:>12}")
+
+if __name__ == "__main__":
+    main()
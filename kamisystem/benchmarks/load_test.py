@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡密验证 API 压测脚本
+向数据库写入测试卡密，以多个并发线程按比例混合执行以下请求，输出 JSON 报告:
+    first     首次激活        POST /api/validate    期望 200
+    repeat    重复验证        POST /api/validate    期望 200
+    mismatch  机器码不匹配    POST /api/validate    期望 403
+    expired   已过期卡密      POST /api/validate    期望 403
+    status    状态查询        GET  /api/status/<code> 期望 200
+    admin     管理列表        GET  /admin/            期望 200
+
+默认在进程内通过 create_app() 的测试客户端发起请求（不经过网络）；
+指定 --url 时改为通过 HTTP 请求已运行的服务，此时 --database-url 必须指向该服务使用的数据库，
+且该服务需以 RATE_LIMIT_ENABLED=False 启动（压测请求来自同一 IP）。
+注意: 测试会重建目标数据库中的表，请使用单独的测试库
+
+示例:
+    python benchmarks/load_test.py --cards 10000 --workers 16 --duration 30 --output report.json
+    python benchmarks/load_test.py --compare baseline.json --output report.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web')
+sys.path.insert(0, WEB_DIR)
+
+DEFAULT_MIX = 'first=5,repeat=70,mismatch=10,expired=5,status=9,admin=1'
+
+# 每种请求期望的状态码
+EXPECTED_STATUS = {
+    'first': 200,
+    'repeat': 200,
+    'mismatch': 403,
+    'expired': 403,
+    'status': 200,
+    'admin': 200
+}
+
+def parse_mix(text):
+    """解析请求比例，如 first=5,repeat=70"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in EXPECTED_STATUS:
+            raise ValueError(f"未知的请求类型: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def percentile(sorted_values, pct):
+    """最近秩百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def git_commit():
+    """当前代码版本，用于比较不同提交的结果"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, cwd=WEB_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+def seed_cards(db, Card, CardStatus, total):
+    """写入测试卡密：一半未使用，其余为已激活和已过期（按 4:1）"""
+    now = datetime.utcnow()
+    unused_count = total // 2
+    active_count = (total - unused_count) * 4 // 5
+    expired_count = total - unused_count - active_count
+    
+    pools = {'unused': [], 'active': [], 'expired': []}
+    batch = []
+    for i in range(total):
+        if i < unused_count:
+            kind, status, machine_code, expire_at = 'unused', CardStatus.UNUSED, None, None
+        elif i < unused_count + active_count:
+            kind, status = 'active', CardStatus.ACTIVE
+            machine_code, expire_at = f"BENCH-M-{i}", now + timedelta(hours=3)
+        else:
+            kind, status = 'expired', CardStatus.ACTIVE
+            machine_code, expire_at = f"BENCH-M-{i}", now - timedelta(minutes=5)
+        
+        code = f"{i:010d}"
+        full_code = f"BENCH-{code}"
+        pools[kind].append((full_code, machine_code))
+        batch.append({
+            'prefix': 'BENCH',
+            'code': code,
+            'full_code': full_code,
+            'status': status,
+            'machine_code': machine_code,
+            'used_at': expire_at - timedelta(hours=3) if expire_at else None,
+            'expire_at': expire_at,
+            'created_at': now,
+            'updated_at': now
+        })
+        if len(batch) >= 5000:
+            db.session.execute(db.insert(Card), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Card), batch)
+        db.session.commit()
+    
+    print(f"已写入测试卡密: 未使用={unused_count}, 已激活={active_count}, 已过期={expired_count}")
+    return pools
+
+class Workload:
+    """按比例生成请求"""
+    
+    def __init__(self, pools, mix, seed):
+        self.pools = pools
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.unused = iter(pools['unused'])
+        self.lock = threading.Lock()
+        self.seed = seed
+    
+    def next_unused(self):
+        with self.lock:
+            return next(self.unused, None)
+    
+    def build(self, rng):
+        """返回 (请求类型, 方法, 路径, JSON 数据)"""
+        name = rng.choices(self.names, self.weights)[0]
+        if name == 'first':
+            card = self.next_unused()
+            if card is None:
+                # 未使用卡密已耗尽，改为重复验证
+                name = 'repeat'
+            else:
+                return name, 'POST', '/api/validate', {'code': card[0], 'machine_code': f"FIRST-{card[0]}"}
+        if name == 'repeat':
+            code, machine_code = rng.choice(self.pools['active'])
+            return name, 'POST', '/api/validate', {'code': code, 'machine_code': machine_code}
+        if name == 'mismatch':
+            code, _ = rng.choice(self.pools['active'])
+            return name, 'POST', '/api/validate', {'code': code, 'machine_code': 'BENCH-WRONG'}
+        if name == 'expired':
+            code, machine_code = rng.choice(self.pools['expired'])
+            return name, 'POST', '/api/validate', {'code': code, 'machine_code': machine_code}
+        if name == 'status':
+            code, _ = rng.choice(self.pools['active'])
+            return name, 'GET', f'/api/status/{code}', None
+        return name, 'GET', '/admin/?per_page=20', None
+
+def make_sender(app, url):
+    """创建请求函数：进程内测试客户端或 HTTP 会话"""
+    if url:
+        import requests
+        session = requests.Session()
+        
+        def send(method, path, payload):
+            response = session.request(method, url.rstrip('/') + path, json=payload)
+            return response.status_code
+        return send
+    
+    client = app.test_client()
+    
+    def send(method, path, payload):
+        response = client.open(path, method=method, json=payload)
+        return response.status_code
+    return send
+
+def run_load(app, url, workload, workers, duration, max_requests):
+    """并发执行请求，返回每个请求的 (类型, 状态码, 耗时秒)"""
+    samples = []
+    samples_lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+    
+    def worker(index):
+        rng = random.Random(workload.seed + index)
+        send = make_sender(app, url)
+        local = []
+        while time.perf_counter() < deadline:
+            if max_requests and next(counter) >= max_requests:
+                break
+            name, method, path, payload = workload.build(rng)
+            start = time.perf_counter()
+            try:
+                status = send(method, path, payload)
+            except Exception:
+                status = -1
+            local.append((name, status, time.perf_counter() - start))
+        with samples_lock:
+            samples.extend(local)
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+def summarize(samples, elapsed):
+    """按请求类型统计延迟与吞吐"""
+    def stats(entries):
+        latencies = sorted(latency * 1000 for _, _, latency in entries)
+        codes = {}
+        for _, status, _ in entries:
+            codes[str(status)] = codes.get(str(status), 0) + 1
+        unexpected = sum(1 for name, status, _ in entries if status != EXPECTED_STATUS[name])
+        return {
+            'count': len(entries),
+            'rps': round(len(entries) / elapsed, 1) if elapsed else 0,
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+            'p90_ms': round(percentile(latencies, 90), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+            'max_ms': round(latencies[-1], 3) if latencies else None,
+            'status_codes': codes,
+            'unexpected': unexpected
+        }
+    
+    by_name = {}
+    for sample in samples:
+        by_name.setdefault(sample[0], []).append(sample)
+    
+    return {
+        'overall': stats(samples),
+        'workloads': {name: stats(entries) for name, entries in sorted(by_name.items())}
+    }
+
+def print_report(report):
+    print()
+    print(f"{'请求类型':<10}{'数量':>9}{'RPS':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'异常':>7}")
+    rows = list(report['results']['workloads'].items()) + [('overall', report['results']['overall'])]
+    for name, item in rows:
+        print(f"{name:<12}{item['count']:>9}{item['rps']:>10}{item['p50_ms']:>10}{item['p99_ms']:>10}{item['unexpected']:>7}")
+
+def print_comparison(report, baseline):
+    """与基准报告比较 p50/p99/RPS 的变化"""
+    def change(new, old):
+        if new is None or not old:
+            return '    n/a'
+        return f"{(new - old) / old * 100:+6.1f}%"
+    
+    print()
+    print(f"与基准 {baseline['meta'].get('git_commit')} 比较:")
+    print(f"{'请求类型':<10}{'RPS':>10}{'p50':>10}{'p99':>10}")
+    current = dict(report['results']['workloads'], overall=report['results']['overall'])
+    previous = dict(baseline['results']['workloads'], overall=baseline['results']['overall'])
+    for name, item in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        print(f"{name:<12}{change(item['rps'], old['rps']):>10}"
+              f"{change(item['p50_ms'], old['p50_ms']):>10}{change(item['p99_ms'], old['p99_ms']):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="卡密验证 API 压测")
+    parser.add_argument("--database-url", help="数据库地址，默认使用临时 SQLite 文件")
+    parser.add_argument("--url", help="已运行服务的地址，如 http://localhost:5000；默认在进程内测试")
+    parser.add_argument("--cards", type=int, default=10000, help="写入的测试卡密数量")
+    parser.add_argument("--workers", type=int, default=8, help="并发线程数")
+    parser.add_argument("--duration", type=float, default=10, help="持续时间（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="最多请求数，0 表示不限制")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"请求比例，默认 {DEFAULT_MIX}")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--output", help="输出 JSON 报告到文件")
+    parser.add_argument("--compare", help="与之前的 JSON 报告比较")
+    args = parser.parse_args()
+    
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db')
+    os.environ['DATABASE_URL'] = database_url
+    # 压测请求都来自同一 IP 与少量机器码，关闭限流
+    os.environ['RATE_LIMIT_ENABLED'] = 'False'
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from app import create_app
+    from models import db, Card, CardStatus
+    
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        pools = seed_cards(db, Card, CardStatus, args.cards)
+    
+    mix = parse_mix(args.mix)
+    workload = Workload(pools, mix, args.seed)
+    print(f"开始压测: 并发={args.workers}, 时长={args.duration}秒, 比例={args.mix}")
+    samples, elapsed = run_load(app, args.url, workload, args.workers, args.duration, args.requests)
+    
+    report = {
+        'meta': {
+            'git_commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'database_url': database_url.split('@')[-1],
+            'target': args.url or 'in-process',
+            'cards': args.cards,
+            'workers': args.workers,
+            'duration': round(elapsed, 3),
+            'mix': mix,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'results': summarize(samples, elapsed)
+    }
+    print_report(report)
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存到: {args.output}")
+    
+    return 0 if report['results']['overall']['unexpected'] == 0 else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,288 +1,602 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-卡密授权管理系统客户端示例
-演示如何在其他应用中集成卡密验证功能
-"""
-
-import requests
-import json
-import uuid
-import platform
-import hashlib
-from datetime import datetime, timedelta
-
-class KamiClient:
-    """卡密验证客户端"""
-    
-    def __init__(self, api_url="http://localhost:5000/api"):
-        self.api_url = api_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'KamiClient/1.0'
-        })
-    
-    def generate_machine_code(self):
-        """生成机器码"""
-        # 获取系统信息
-        system_info = {
-            'system': platform.system(),
-            'node': platform.node(),
-            'processor': platform.processor(),
-            'architecture': platform.architecture()[0]
-        }
-        
-        # 生成唯一标识
-        info_str = json.dumps(system_info, sort_keys=True)
-        machine_code = hashlib.md5(info_str.encode()).hexdigest()
-        
-        return f"PC-{machine_code[:16].upper()}"
-    
-    def validate_card(self, card_code, machine_code=None):
-        """验证卡密"""
-        if not machine_code:
-            machine_code = self.generate_machine_code()
-        
-        data = {
-            "code": card_code,
-            "machine_code": machine_code
-        }
-        
-        try:
-            response = self.session.post(f"{self.api_url}/validate", json=data)
-            result = response.json()
-            
-            if response.status_code == 200 and result.get("status") == "success":
-                return {
-                    "success": True,
-                    "message": result.get("message"),
-                    "expire_at": result.get("expire_at"),
-                    "remaining_hours": result.get("remaining_hours"),
-                    "machine_code": machine_code
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": result.get("message", "验证失败"),
-                    "error_code": response.status_code
-                }
-        
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "message": f"网络错误: {str(e)}",
-                "error_code": -1
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"未知错误: {str(e)}",
-                "error_code": -2
-            }
-    
-    def get_card_status(self, card_code):
-        """获取卡密状态"""
-        try:
-            response = self.session.get(f"{self.api_url}/status/{card_code}")
-            result = response.json()
-            
-            if response.status_code == 200 and result.get("status") == "success":
-                return {
-                    "success": True,
-                    "data": result.get("data")
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": result.get("message", "获取状态失败"),
-                    "error_code": response.status_code
-                }
-        
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "message": f"网络错误: {str(e)}",
-                "error_code": -1
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"未知错误: {str(e)}",
-                "error_code": -2
-            }
-    
-    def check_service_health(self):
-        """检查服务健康状态"""
-        try:
-            response = self.session.get(f"{self.api_url}/health")
-            if response.status_code == 200:
-                return True
-            return False
-        except:
-            return False
-
-class SimpleApp:
-    """简单应用示例"""
-    
-    def __init__(self):
-        self.client = KamiClient()
-        self.authorized = False
-        self.card_info = None
-        self.machine_code = self.client.generate_machine_code()
-    
-    def show_welcome(self):
-        """显示欢迎界面"""
-        print("=" * 60)
-        print("欢迎使用示例应用")
-        print("=" * 60)
-        print(f"机器码: {self.machine_code}")
-        print()
-        
-        # 检查服务状态
-        if not self.client.check_service_health():
-            print("⚠️  警告: 卡密验证服务不可用")
-            print("请确保卡密授权管理系统正在运行")
-            print()
-    
-    def request_card_input(self):
-        """请求输入卡密"""
-        print("请输入您的卡密进行验证:")
-        print("(示例卡密: VIP-DEMO123456, PREMIUM-TEST789012, BASIC-SAMPLE345678)")
-        print()
-        
-        card_code = input("卡密: ").strip()
-        if not card_code:
-            print("❌ 卡密不能为空")
-            return False
-        
-        return card_code
-    
-    def validate_authorization(self, card_code):
-        """验证授权"""
-        print(f"正在验证卡密: {card_code}")
-        print("请稍候...")
-        
-        result = self.client.validate_card(card_code, self.machine_code)
-        
-        if result["success"]:
-            print("✅ 验证成功！")
-            print(f"消息: {result['message']}")
-            if result.get("expire_at"):
-                print(f"过期时间: {result['expire_at']}")
-            if result.get("remaining_hours"):
-                print(f"剩余时间: {result['remaining_hours']} 小时")
-            
-            self.authorized = True
-            self.card_info = result
-            return True
-        else:
-            print("❌ 验证失败")
-            print(f"错误: {result['message']}")
-            return False
-    
-    def show_main_menu(self):
-        """显示主菜单"""
-        print("\n" + "=" * 40)
-        print("主菜单")
-        print("=" * 40)
-        print("1. 查看卡密状态")
-        print("2. 重新验证")
-        print("3. 模拟功能使用")
-        print("4. 退出")
-        print()
-        
-        choice = input("请选择 (1-4): ").strip()
-        return choice
-    
-    def show_card_status(self):
-        """显示卡密状态"""
-        if not self.card_info:
-            print("❌ 没有卡密信息")
-            return
-        
-        # 获取最新状态
-        card_code = input("请输入卡密代码: ").strip()
-        if not card_code:
-            print("❌ 卡密代码不能为空")
-            return
-        
-        result = self.client.get_card_status(card_code)
-        
-        if result["success"]:
-            data = result["data"]
-            print("\n📊 卡密状态信息:")
-            print(f"  代码: {data.get('full_code')}")
-            print(f"  状态: {data.get('status')}")
-            print(f"  创建时间: {data.get('created_at')}")
-            print(f"  使用时间: {data.get('used_at') or '未使用'}")
-            print(f"  过期时间: {data.get('expire_at') or '未设置'}")
-            print(f"  机器码: {data.get('machine_code') or '未绑定'}")
-            if data.get('remaining_hours'):
-                print(f"  剩余时间: {data['remaining_hours']} 小时")
-        else:
-            print(f"❌ 获取状态失败: {result['message']}")
-    
-    def simulate_feature_usage(self):
-        """模拟功能使用"""
-        print("\n🎯 模拟功能使用")
-        print("这里是应用的核心功能...")
-        print("功能1: 数据处理 ✅")
-        print("功能2: 报表生成 ✅")
-        print("功能3: 高级分析 ✅")
-        print("所有功能正常运行！")
-    
-    def run(self):
-        """运行应用"""
-        self.show_welcome()
-        
-        # 授权验证循环
-        while not self.authorized:
-            card_code = self.request_card_input()
-            if not card_code:
-                continue
-            
-            if self.validate_authorization(card_code):
-                break
-            
-            retry = input("\n是否重试? (y/n): ").strip().lower()
-            if retry != 'y':
-                print("退出应用")
-                return
-        
-        # 主功能循环
-        while True:
-            choice = self.show_main_menu()
-            
-            if choice == '1':
-                self.show_card_status()
-            elif choice == '2':
-                self.authorized = False
-                self.card_info = None
-                print("重新验证...")
-                card_code = self.request_card_input()
-                if card_code:
-                    self.validate_authorization(card_code)
-            elif choice == '3':
-                self.simulate_feature_usage()
-            elif choice == '4':
-                print("感谢使用！")
-                break
-            else:
-                print("❌ 无效选择")
-            
-            input("\n按回车键继续...")
-
-def main():
-    """主函数"""
-    try:
-        app = SimpleApp()
-        app.run()
-    except KeyboardInterrupt:
-        print("\n\n程序被用户中断")
-    except Exception as e:
-        print(f"\n❌ 程序错误: {str(e)}")
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡密授权管理系统客户端示例
+演示如何在其他应用中集成卡密验证功能
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+import base64
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import platform
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    from cryptography.exceptions import InvalidSignature
+except ImportError:
+    Ed25519PublicKey = None
+
+SHANGHAI_TZ = timezone(timedelta(hours=8))
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+# 可以重试的响应状态码（限流与服务端临时故障）
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """熔断期间不发送请求"""
+
+class CircuitBreaker:
+    """熔断器：连续 threshold 次请求失败后熔断，冷却期内不发送请求，之后只放行一个试探请求
+    
+    试探失败时冷却时间加倍（不超过 max_cooldown），冷却时间带 ±50% 的随机抖动，
+    避免大量客户端在同一时刻恢复请求。threshold 为 0 时不熔断。
+    """
+    
+    def __init__(self, threshold=5, cooldown=30, max_cooldown=120, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """是否可以发送请求"""
+        if not self.threshold:
+            return True
+        with self._lock:
+            if self.failures < self.threshold:
+                return True
+            if self._probing or self.clock() < self.open_until:
+                return False
+            self._probing = True
+            return True
+    
+    def record(self, success):
+        """记录一次请求结果"""
+        with self._lock:
+            self._probing = False
+            if success:
+                self.failures = 0
+                self.opened = 0
+                return
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                cooldown = min(self.cooldown * 2 ** self.opened, self.max_cooldown)
+                self.open_until = self.clock() + cooldown * random.uniform(0.5, 1.5)
+                self.opened += 1
+
+def success_result(result, machine_code):
+    """服务器返回的验证成功结果转换为 validate_card 的返回格式"""
+    return {
+        "success": True,
+        "message": result.get("message"),
+        "expire_at": result.get("expire_at"),
+        "remaining_hours": result.get("remaining_hours"),
+        "machine_code": machine_code
+    }
+
+def status_result(result):
+    """服务器返回的卡密状态转换为 get_card_status 的返回格式"""
+    return {"success": True, "data": result.get("data")}
+
+def error_result(message, error_code):
+    """验证失败的返回格式，error_code 为 HTTP 状态码，网络错误为 -1，其他错误为 -2"""
+    return {"success": False, "message": message, "error_code": error_code}
+
+def batch_results(items, result):
+    """批量验证响应中的逐项结果，顺序与请求的 items 一致"""
+    results = []
+    for item, item_result in zip(items, result.get("results", [])):
+        if item_result.get("status") == "success":
+            results.append(success_result(item_result, item["machine_code"]))
+        else:
+            results.append(error_result(item_result.get("message", "验证失败"), item_result.get("http_status")))
+    return results
+
+class RetryCacheMixin:
+    """KamiClient 与 AsyncKamiClient 共用的退避计算与验证结果缓存
+    
+    使用方需设置 backoff_base、backoff_cap、cache_margin、clock 与 _results（dict），
+    max_cached 不为 None 时缓存最多保留该数量的结果。
+    """
+    
+    max_cached = None
+    
+    def _backoff(self, attempt, status=None, retry_after=None):
+        """第 attempt 次重试前的等待秒数，429 响应的 Retry-After 优先"""
+        if status == 429:
+            try:
+                return min(float(retry_after), self.backoff_cap)
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+    
+    def _cached_result(self, card_code, machine_code):
+        """缓存中仍在有效期内的验证结果"""
+        entry = self._results.get((card_code, machine_code))
+        if entry is None:
+            return None
+        result, expire_ts = entry
+        remaining = expire_ts - self.clock()
+        if self.cache_margin is None or remaining <= self.cache_margin:
+            self._results.pop((card_code, machine_code), None)
+            return None
+        return dict(result, remaining_hours=round(remaining / 3600, 2), cached=True)
+    
+    def _cache_result(self, card_code, machine_code, result):
+        if self.cache_margin is None or not result.get("expire_at"):
+            return
+        try:
+            expire_ts = datetime.fromisoformat(result["expire_at"]).timestamp()
+        except ValueError:
+            return
+        if self.max_cached is not None and len(self._results) >= self.max_cached:
+            # 丢弃最早加入的结果
+            del self._results[next(iter(self._results))]
+        self._results[(card_code, machine_code)] = (result, expire_ts)
+    
+    def _forget_result(self, card_code, machine_code):
+        """服务器拒绝后丢弃缓存的结果"""
+        self._results.pop((card_code, machine_code), None)
+
+class KamiClient(RetryCacheMixin):
+    """卡密验证客户端
+    
+    连接与重试:
+        所有请求复用同一个 keep-alive 连接池（pool_size），timeout 为 (连接超时, 读取超时) 秒。
+        默认不重试、不熔断、不缓存结果，每次验证都以服务器的结果为准。大量客户端同时部署时可开启弹性模式，
+        例如 KamiClient(retries=3, breaker_threshold=5, cache_margin=60):
+        网络错误与 429/5xx 响应最多重试 retries 次，等待时间为带完全抖动的指数退避
+        uniform(0, min(backoff_cap, backoff_base * 2^n))，429 响应的 Retry-After 优先。
+        breaker_threshold 大于 0 时，连续 breaker_threshold 次请求失败后熔断 breaker_cooldown 秒，期间不发送请求；
+        之后的试探请求仍失败时冷却时间加倍，最长 breaker_max_cooldown 秒。
+    
+    结果缓存:
+        未传入机器码时使用的本机机器码只计算一次。
+        cache_margin 不为 None 时，验证成功的结果缓存到卡密过期前 cache_margin 秒，期间重复验证不请求服务器，
+        管理员在此期间修改或删除卡密不会立即生效；服务器拒绝后缓存随之清除。
+    
+    离线授权令牌:
+        指定 license_keys（服务端 GET /api/license-keys 返回的 {密钥ID: 公钥}，应随客户端发布而不是运行时下载）时，
+        验证成功后保存服务端签发的离线授权令牌，之后在本地校验签名，直到令牌到期前 refresh_margin 秒才再次请求服务器；
+        服务器不可用时，未过期的令牌仍可使用。指定 license_file 时令牌保存到文件，重启后继续有效。
+        离线校验需要安装 cryptography。
+    """
+    
+    def __init__(self, api_url="http://localhost:5000/api", license_keys=None, refresh_margin=300,
+                 license_file=None, timeout=(3, 10), retries=0, backoff_base=0.5, backoff_cap=30,
+                 breaker_threshold=0, breaker_cooldown=30, breaker_max_cooldown=120, cache_margin=None,
+                 pool_size=10):
+        self.api_url = api_url
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'KamiClient/1.0'
+        })
+        # 重试由 _request 处理，连接池不再自动重试
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown, breaker_max_cooldown)
+        self.cache_margin = cache_margin
+        self._results = {}
+        self._machine_code = None
+        self.refresh_margin = refresh_margin
+        self.license_keys = self._load_public_keys(license_keys)
+        self.license_file = license_file
+        self.licenses = self._load_licenses()
+        # 当前时间（秒级时间戳），便于模拟测试替换
+        self.clock = time.time
+    
+    def _load_public_keys(self, license_keys):
+        """解析公钥，支持 {密钥ID: 公钥} 或 "密钥ID:公钥,..." 形式"""
+        if not license_keys:
+            return {}
+        if Ed25519PublicKey is None:
+            raise ImportError("离线授权令牌校验需要安装 cryptography 包")
+        if isinstance(license_keys, str):
+            license_keys = dict(entry.strip().split(':', 1) for entry in license_keys.split(',') if entry.strip())
+        return {kid: Ed25519PublicKey.from_public_bytes(_b64decode(public))
+                for kid, public in license_keys.items()}
+    
+    def _load_licenses(self):
+        """读取保存的令牌 {(卡密, 机器码): 令牌}"""
+        if not self.license_file or not os.path.exists(self.license_file):
+            return {}
+        try:
+            with open(self.license_file, 'r', encoding='utf-8') as f:
+                return {tuple(key.split('|', 1)): token for key, token in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_licenses(self):
+        if not self.license_file:
+            return
+        try:
+            with open(self.license_file, 'w', encoding='utf-8') as f:
+                json.dump({f"{code}|{machine_code}": token for (code, machine_code), token in self.licenses.items()}, f)
+        except OSError:
+            pass
+    
+    def verify_license(self, token, card_code=None, machine_code=None):
+        """校验离线授权令牌的签名、卡密、机器码与有效期，成功返回令牌内容，否则返回 None"""
+        if not token or not self.license_keys:
+            return None
+        try:
+            version, kid, payload, signature = token.split('.')
+            key = self.license_keys.get(kid)
+            if version != 'v1' or key is None:
+                return None
+            key.verify(_b64decode(signature), f"{version}.{kid}.{payload}".encode('ascii'))
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, InvalidSignature):
+            return None
+        
+        if card_code and claims.get('c') != card_code:
+            return None
+        if machine_code and claims.get('m') != machine_code:
+            return None
+        if self.clock() >= claims.get('x', 0):
+            return None
+        return claims
+    
+    def _offline_result(self, claims):
+        """由令牌内容构造与在线验证相同格式的结果"""
+        return {
+            "success": True,
+            "message": "授权成功",
+            "expire_at": datetime.fromtimestamp(claims['e'], SHANGHAI_TZ).isoformat(),
+            "remaining_hours": round((claims['e'] - self.clock()) / 3600, 2),
+            "machine_code": claims['m'],
+            "offline": True
+        }
+    
+    def _request(self, method, path, **kwargs):
+        """发送请求：熔断、超时与退避重试，返回最后一次的响应
+        
+        每次请求失败都计入熔断器，熔断后不再重试。没有得到响应时抛出最后一次的网络异常，
+        熔断期间抛出 CircuitOpenError。
+        """
+        send = getattr(self.session, method)
+        response = error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                hint = (response.status_code, response.headers.get('Retry-After')) if response is not None else ()
+                time.sleep(self._backoff(attempt - 1, *hint))
+            if not self.breaker.allow():
+                if response is None:
+                    raise error or CircuitOpenError("验证服务暂时不可用（熔断中）")
+                return response
+            try:
+                response = send(f"{self.api_url}{path}", timeout=self.timeout, **kwargs)
+                error = None
+            except requests.exceptions.RequestException as e:
+                response, error = None, e
+            if response is not None and response.status_code not in RETRY_STATUS:
+                self.breaker.record(True)
+                return response
+            self.breaker.record(False)
+        
+        if response is None:
+            raise error
+        return response
+    
+    @property
+    def machine_code(self):
+        """本机机器码，只计算一次"""
+        if self._machine_code is None:
+            self._machine_code = self.generate_machine_code()
+        return self._machine_code
+    
+    def generate_machine_code(self):
+        """生成机器码"""
+        # 获取系统信息
+        system_info = {
+            'system': platform.system(),
+            'node': platform.node(),
+            'processor': platform.processor(),
+            'architecture': platform.architecture()[0]
+        }
+        
+        # 生成唯一标识
+        info_str = json.dumps(system_info, sort_keys=True)
+        machine_code = hashlib.md5(info_str.encode()).hexdigest()
+        
+        return f"PC-{machine_code[:16].upper()}"
+    
+    def validate_card(self, card_code, machine_code=None):
+        """验证卡密
+        
+        配置了 license_keys 时优先使用本地令牌，令牌接近到期才请求服务器；
+        服务器不可用（网络错误、429、5xx）时，未过期的令牌仍视为验证成功。
+        """
+        if not machine_code:
+            machine_code = self.machine_code
+        
+        claims = None
+        if self.license_keys:
+            claims = self.verify_license(self.licenses.get((card_code, machine_code)), card_code, machine_code)
+            if claims and self.clock() < claims['x'] - self.refresh_margin:
+                return self._offline_result(claims)
+        
+        cached = self._cached_result(card_code, machine_code)
+        if cached:
+            return cached
+        
+        data = {
+            "code": card_code,
+            "machine_code": machine_code
+        }
+        if self.license_keys:
+            data["token"] = True
+        
+        try:
+            response = self._request('post', "/validate", json=data)
+            result = response.json()
+            
+            if response.status_code == 200 and result.get("status") == "success":
+                token = result.get("license_token")
+                if token and self.verify_license(token, card_code, machine_code):
+                    self.licenses[(card_code, machine_code)] = token
+                    self._save_licenses()
+                validated = success_result(result, machine_code)
+                self._cache_result(card_code, machine_code, validated)
+                return validated
+            elif claims and (response.status_code == 429 or response.status_code >= 500):
+                return self._offline_result(claims)
+            else:
+                # 服务器明确拒绝（过期、机器码不匹配、卡密已删除），丢弃本地令牌与缓存结果
+                self._forget_result(card_code, machine_code)
+                if self.licenses.pop((card_code, machine_code), None):
+                    self._save_licenses()
+                return error_result(result.get("message", "验证失败"), response.status_code)
+        
+        except requests.exceptions.RequestException as e:
+            if claims:
+                return self._offline_result(claims)
+            return error_result(f"网络错误: {str(e)}", -1)
+        except Exception as e:
+            # 如代理返回的非 JSON 错误页
+            if claims:
+                return self._offline_result(claims)
+            return error_result(f"未知错误: {str(e)}", -2)
+    
+    def validate_many(self, cards, machine_code=None):
+        """批量验证卡密
+        
+        cards 为卡密代码列表，或 (卡密, 机器码) 元组列表；未指定机器码时使用本机机器码。
+        返回与 validate_card 格式相同的结果列表，顺序与输入一致。
+        """
+        items = []
+        for card in cards:
+            if isinstance(card, (tuple, list)):
+                card_code, card_machine_code = card
+            else:
+                if not machine_code:
+                    machine_code = self.machine_code
+                card_code, card_machine_code = card, machine_code
+            items.append({"code": card_code, "machine_code": card_machine_code})
+        
+        try:
+            response = self._request('post', "/validate/batch", json={"items": items})
+            result = response.json()
+            
+            if response.status_code != 200 or result.get("status") != "success":
+                return [error_result(result.get("message", "验证失败"), response.status_code) for _ in items]
+            
+            return batch_results(items, result)
+        
+        except requests.exceptions.RequestException as e:
+            return [error_result(f"网络错误: {str(e)}", -1) for _ in items]
+        except Exception as e:
+            return [error_result(f"未知错误: {str(e)}", -2) for _ in items]
+    
+    def get_card_status(self, card_code):
+        """获取卡密状态"""
+        try:
+            response = self._request('get', f"/status/{card_code}")
+            result = response.json()
+            
+            if response.status_code == 200 and result.get("status") == "success":
+                return status_result(result)
+            else:
+                return error_result(result.get("message", "获取状态失败"), response.status_code)
+        
+        except requests.exceptions.RequestException as e:
+            return error_result(f"网络错误: {str(e)}", -1)
+        except Exception as e:
+            return error_result(f"未知错误: {str(e)}", -2)
+    
+    def check_service_health(self):
+        """检查服务健康状态"""
+        try:
+            # 健康检查只探测一次，不重试也不计入熔断
+            response = self.session.get(f"{self.api_url}/health", timeout=self.timeout)
+            if response.status_code == 200:
+                return True
+            return False
+        except:
+            return False
+
+class SimpleApp:
+    """简单应用示例"""
+    
+    def __init__(self):
+        self.client = KamiClient()
+        self.authorized = False
+        self.card_info = None
+        self.machine_code = self.client.machine_code
+    
+    def show_welcome(self):
+        """显示欢迎界面"""
+        print("=" * 60)
+        print("欢迎使用示例应用")
+        print("=" * 60)
+        print(f"机器码: {self.machine_code}")
+        print()
+        
+        # 检查服务状态
+        if not self.client.check_service_health():
+            print("⚠️  警告: 卡密验证服务不可用")
+            print("请确保卡密授权管理系统正在运行")
+            print()
+    
+    def request_card_input(self):
+        """请求输入卡密"""
+        print("请输入您的卡密进行验证:")
+        print("(示例卡密: VIP-DEMO123456, PREMIUM-TEST789012, BASIC-SAMPLE345678)")
+        print()
+        
+        card_code = input("卡密: ").strip()
+        if not card_code:
+            print("❌ 卡密不能为空")
+            return False
+        
+        return card_code
+    
+    def validate_authorization(self, card_code):
+        """验证授权"""
+        print(f"正在验证卡密: {card_code}")
+        print("请稍候...")
+        
+        result = self.client.validate_card(card_code, self.machine_code)
+        
+        if result["success"]:
+            print("✅ 验证成功！")
+            print(f"消息: {result['message']}")
+            if result.get("expire_at"):
+                print(f"过期时间: {result['expire_at']}")
+            if result.get("remaining_hours"):
+                print(f"剩余时间: {result['remaining_hours']} 小时")
+            
+            self.authorized = True
+            self.card_info = result
+            return True
+        else:
+            print("❌ 验证失败")
+            print(f"错误: {result['message']}")
+            return False
+    
+    def show_main_menu(self):
+        """显示主菜单"""
+        print("\n" + "=" * 40)
+        print("主菜单")
+        print("=" * 40)
+        print("1. 查看卡密状态")
+        print("2. 重新验证")
+        print("3. 模拟功能使用")
+        print("4. 退出")
+        print()
+        
+        choice = input("请选择 (1-4): ").strip()
+        return choice
+    
+    def show_card_status(self):
+        """显示卡密状态"""
+        if not self.card_info:
+            print("❌ 没有卡密信息")
+            return
+        
+        # 获取最新状态
+        card_code = input("请输入卡密代码: ").strip()
+        if not card_code:
+            print("❌ 卡密代码不能为空")
+            return
+        
+        result = self.client.get_card_status(card_code)
+        
+        if result["success"]:
+            data = result["data"]
+            print("\n📊 卡密状态信息:")
+            print(f"  代码: {data.get('full_code')}")
+            print(f"  状态: {data.get('status')}")
+            print(f"  创建时间: {data.get('created_at')}")
+            print(f"  使用时间: {data.get('used_at') or '未使用'}")
+            print(f"  过期时间: {data.get('expire_at') or '未设置'}")
+            print(f"  机器码: {data.get('machine_code') or '未绑定'}")
+            if data.get('remaining_hours'):
+                print(f"  剩余时间: {data['remaining_hours']} 小时")
+        else:
+            print(f"❌ 获取状态失败: {result['message']}")
+    
+    def simulate_feature_usage(self):
+        """模拟功能使用"""
+        print("\n🎯 模拟功能使用")
+        print("这里是应用的核心功能...")
+        print("功能1: 数据处理 ✅")
+        print("功能2: 报表生成 ✅")
+        print("功能3: 高级分析 ✅")
+        print("所有功能正常运行！")
+    
+    def run(self):
+        """运行应用"""
+        self.show_welcome()
+        
+        # 授权验证循环
+        while not self.authorized:
+            card_code = self.request_card_input()
+            if not card_code:
+                continue
+            
+            if self.validate_authorization(card_code):
+                break
+            
+            retry = input("\n是否重试? (y/n): ").strip().lower()
+            if retry != 'y':
+                print("退出应用")
+                return
+        
+        # 主功能循环
+        while True:
+            choice = self.show_main_menu()
+            
+            if choice == '1':
+                self.show_card_status()
+            elif choice == '2':
+                self.authorized = False
+                self.card_info = None
+                print("重新验证...")
+                card_code = self.request_card_input()
+                if card_code:
+                    self.validate_authorization(card_code)
+            elif choice == '3':
+                self.simulate_feature_usage()
+            elif choice == '4':
+                print("感谢使用！")
+                break
+            else:
+                print("❌ 无效选择")
+            
+            input("\n按回车键继续...")
+
+def main():
+    """主函数"""
+    try:
+        app = SimpleApp()
+        app.run()
+    except KeyboardInterrupt:
+        print("\n\n程序被用户中断")
+    except Exception as e:
+        print(f"\n❌ 程序错误: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,47 @@
-CREATE DATABASE IF NOT EXISTS kamisystem DEFAULT CHARSET utf8mb4 COLLATE utf8mb4_unicode_ci;
-USE kamisystem;
-
-CREATE TABLE IF NOT EXISTS cards (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    prefix VARCHAR(16) NOT NULL COMMENT '卡密前缀',
-    code VARCHAR(64) NOT NULL COMMENT '随机生成主体',
-    full_code VARCHAR(128) NOT NULL UNIQUE COMMENT '完整卡密代码',
-    used_at DATETIME DEFAULT NULL COMMENT '第一次使用时间',
-    expire_at DATETIME DEFAULT NULL COMMENT '过期时间',
-    machine_code VARCHAR(128) DEFAULT NULL COMMENT '绑定设备码',
-    status ENUM('UNUSED', 'ACTIVE', 'EXPIRED') DEFAULT 'UNUSED' COMMENT '卡密状态',
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    
-    INDEX idx_full_code (full_code),
-    INDEX idx_status (status),
-    INDEX idx_prefix (prefix),
-    INDEX idx_machine_code (machine_code),
-    INDEX idx_expire_at (expire_at)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='卡密表';
-
+CREATE DATABASE IF NOT EXISTS kamisystem DEFAULT CHARSET utf8mb4 COLLATE utf8mb4_unicode_ci;
+USE kamisystem;
+
+CREATE TABLE IF NOT EXISTS cards (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    prefix VARCHAR(16) NOT NULL COMMENT '卡密前缀',
+    code VARCHAR(64) NOT NULL COMMENT '随机生成主体',
+    full_code VARCHAR(128) NOT NULL UNIQUE COMMENT '完整卡密代码',
+    used_at DATETIME DEFAULT NULL COMMENT '第一次使用时间',
+    expire_at DATETIME DEFAULT NULL COMMENT '过期时间',
+    machine_code VARCHAR(128) DEFAULT NULL COMMENT '绑定设备码',
+    status ENUM('UNUSED', 'ACTIVE', 'EXPIRED') DEFAULT 'UNUSED' COMMENT '卡密状态',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    
+    -- 与 web/models.py 中 Card 声明的索引一致，已有数据库通过 web/utils/migrations.py 中的迁移变更
+    INDEX idx_status (status),
+    INDEX idx_prefix (prefix),
+    INDEX idx_machine_code (machine_code),
+    INDEX idx_status_prefix_id (status, prefix, id),
+    INDEX idx_status_prefix_created_at (status, prefix, created_at, full_code),
+    INDEX idx_status_expire_at (status, expire_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='卡密表';
+
+CREATE TABLE IF NOT EXISTS card_search_grams (
+    gram VARCHAR(8) NOT NULL COMMENT '卡密代码 n-gram',
+    card_id INT NOT NULL COMMENT '卡密ID',
+    
+    PRIMARY KEY (gram, card_id),
+    INDEX idx_card_id (card_id),
+    CONSTRAINT fk_card_search_grams_card FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='卡密搜索 n-gram 索引表';
+
+CREATE TABLE IF NOT EXISTS card_machine_grams (
+    gram VARCHAR(8) NOT NULL COMMENT '机器码 n-gram',
+    card_id INT NOT NULL COMMENT '卡密ID',
+    
+    PRIMARY KEY (gram, card_id),
+    INDEX idx_machine_gram_card_id (card_id),
+    CONSTRAINT fk_card_machine_grams_card FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='机器码搜索 n-gram 索引表';
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '迁移版本',
+    description VARCHAR(128) NOT NULL COMMENT '迁移说明',
+    applied_at DATETIME DEFAULT NULL COMMENT '执行时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='已执行的数据库迁移';
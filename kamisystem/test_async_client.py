@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+异步客户端 AsyncKamiClient 测试脚本
+在本进程内以临时 SQLite 数据库启动 Flask 应用（包含 api 蓝图）作为本地服务，
+验证接口结果、相同请求合并、并发上限、结果缓存与熔断。需要安装 aiohttp。
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web'))
+
+from async_client import AsyncKamiClient
+
+class RequestCounter:
+    """WSGI 中间件：统计请求数与最大同时处理数，delay 秒后才交给应用处理，使并发请求互相重叠"""
+    
+    def __init__(self, app, delay=0.05):
+        self.app = app
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.active = 0
+        self.max_active = 0
+    
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            return self.app(environ, start_response)
+        finally:
+            with self.lock:
+                self.active -= 1
+    
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.max_active = 0
+    
+    def total(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+def start_local_server():
+    """启动本地服务，返回 (服务器, 请求计数中间件, api 地址)"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_async_client.db')
+    # 测试请求都来自本机，关闭限流
+    os.environ['RATE_LIMIT_ENABLED'] = 'False'
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from werkzeug.serving import make_server
+    from app import create_app
+    from models import db, Card, CardStatus
+    
+    app = create_app()
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        cards = [Card(prefix='ASYNC', code=f"{i:08d}", full_code=f"ASYNC-{i:08d}", status=CardStatus.UNUSED,
+                      created_at=now) for i in range(100)]
+        cards.append(Card(prefix='ASYNC', code='EXPIRED0', full_code='ASYNC-EXPIRED0', status=CardStatus.ACTIVE,
+                          machine_code='MACHINE-X', used_at=now - timedelta(hours=4),
+                          expire_at=now - timedelta(hours=1), created_at=now))
+        db.session.add_all(cards)
+        db.session.commit()
+    
+    counter = RequestCounter(app.wsgi_app)
+    app.wsgi_app = counter
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter, f"http://127.0.0.1:{server.server_port}/api"
+
+class AsyncClientTester:
+    def __init__(self, api_url, counter):
+        self.api_url = api_url
+        self.counter = counter
+        self.test_results = []
+    
+    def log_test(self, test_name, success, message=""):
+        """记录测试结果"""
+        self.test_results.append({"test": test_name, "success": success, "message": message})
+        status = "✓" if success else "✗"
+        print(f"{status} {test_name}: {message}")
+    
+    async def test_health_check(self, client):
+        """测试健康检查"""
+        healthy = await client.check_service_health()
+        self.log_test("健康检查", healthy, "服务运行正常" if healthy else "服务状态异常")
+    
+    async def test_validate(self, client):
+        """测试激活、重复验证与错误结果"""
+        result = await client.validate_card("ASYNC-00000000", "MACHINE-A")
+        self.log_test("首次验证", result["success"] and result["machine_code"] == "MACHINE-A",
+                      result.get("message", ""))
+        
+        self.counter.reset()
+        result = await client.validate_card("ASYNC-00000000", "MACHINE-A")
+        self.log_test("结果缓存", result["success"] and result.get("cached") and self.counter.total() == 0,
+                      f"服务器请求 {self.counter.total()} 次")
+        
+        result = await client.validate_card("ASYNC-00000000", "MACHINE-B")
+        self.log_test("错误机器码", result["error_code"] == 403, result.get("message", ""))
+        
+        result = await client.validate_card("ASYNC-EXPIRED0", "MACHINE-X")
+        self.log_test("过期卡密", result["error_code"] == 403, result.get("message", ""))
+        
+        result = await client.validate_card("NONEXISTENT-123456", "MACHINE-A")
+        self.log_test("不存在的卡密", result["error_code"] == 404, result.get("message", ""))
+    
+    async def test_status(self, client):
+        """测试状态查询"""
+        result = await client.get_card_status("ASYNC-00000000")
+        ok = result["success"] and result["data"]["status"] == "ACTIVE"
+        self.log_test("状态查询", ok, result["data"]["status"] if result["success"] else result.get("message", ""))
+    
+    async def test_validate_many(self, client):
+        """测试批量验证"""
+        results = await client.validate_many([("ASYNC-00000001", "MACHINE-A"), ("NONEXISTENT-1", "MACHINE-A")])
+        ok = results[0]["success"] and results[1]["error_code"] == 404
+        self.log_test("批量验证", ok, f"{[result['success'] for result in results]}")
+    
+    async def test_coalescing(self, client):
+        """同一卡密与机器码的并发验证只请求服务器一次"""
+        self.counter.reset()
+        coalesced = client.coalesced
+        results = await asyncio.gather(*(client.validate_card("ASYNC-00000002", "MACHINE-C") for _ in range(50)))
+        requests = self.counter.requests.get('/api/validate', 0)
+        ok = all(result["success"] for result in results) and requests == 1
+        self.log_test("合并相同请求", ok, f"50 次调用, 服务器请求 {requests} 次, 合并 {client.coalesced - coalesced} 次")
+        
+        self.counter.reset()
+        results = await asyncio.gather(*(client.get_card_status("ASYNC-00000002") for _ in range(20)))
+        requests = self.counter.requests.get('/api/status/ASYNC-00000002', 0)
+        ok = all(result["success"] for result in results) and requests == 1
+        self.log_test("合并状态查询", ok, f"20 次调用, 服务器请求 {requests} 次")
+    
+    async def test_default_no_cache(self):
+        """默认不缓存验证结果，每次验证都请求服务器"""
+        async with AsyncKamiClient(self.api_url) as client:
+            await client.validate_card("ASYNC-00000003", "MACHINE-E")
+            self.counter.reset()
+            result = await client.validate_card("ASYNC-00000003", "MACHINE-E")
+            requests = self.counter.requests.get('/api/validate', 0)
+            ok = result["success"] and not result.get("cached") and requests == 1
+            self.log_test("默认不缓存", ok, f"重复验证, 服务器请求 {requests} 次")
+    
+    async def test_bounded_concurrency(self):
+        """不同卡密的并发验证同时发出的请求不超过 max_concurrency"""
+        async with AsyncKamiClient(self.api_url, max_concurrency=4) as client:
+            self.counter.reset()
+            codes = [f"ASYNC-{i:08d}" for i in range(10, 50)]
+            results = await asyncio.gather(*(client.validate_card(code, "MACHINE-D") for code in codes))
+            ok = all(result["success"] for result in results) and self.counter.max_active <= 4
+            self.log_test("并发上限", ok, f"40 次验证, 最大同时处理 {self.counter.max_active} 个请求")
+    
+    async def test_circuit_breaker(self):
+        """服务不可用时重试后熔断，熔断期间不再发送请求"""
+        async with AsyncKamiClient("http://127.0.0.1:9/api", retries=1, backoff_base=0.01,
+                                   breaker_threshold=2) as client:
+            first = await client.validate_card("ASYNC-00000000", "MACHINE-A")
+            start = time.perf_counter()
+            second = await client.validate_card("ASYNC-00000000", "MACHINE-A")
+            elapsed = time.perf_counter() - start
+            ok = first["error_code"] == -1 and "熔断" in second["message"] and elapsed < 0.01
+            self.log_test("熔断", ok, second["message"])
+    
+    async def run_all_tests(self):
+        """运行所有测试"""
+        print("=" * 60)
+        print("AsyncKamiClient 测试")
+        print("=" * 60)
+        print(f"本地服务: {self.api_url}")
+        print()
+        
+        async with AsyncKamiClient(self.api_url, cache_margin=60) as client:
+            await self.test_health_check(client)
+            await self.test_validate(client)
+            await self.test_status(client)
+            await self.test_validate_many(client)
+            await self.test_coalescing(client)
+        await self.test_default_no_cache()
+        await self.test_bounded_concurrency()
+        await self.test_circuit_breaker()
+        
+        success_count = sum(1 for r in self.test_results if r["success"])
+        total_count = len(self.test_results)
+        print()
+        print(f"总测试数: {total_count}, 成功: {success_count}, 失败: {total_count - success_count}")
+        return success_count == total_count
+
+def main():
+    """主函数"""
+    server, counter, api_url = start_local_server()
+    try:
+        success = asyncio.run(AsyncClientTester(api_url, counter).run_all_tests())
+    finally:
+        server.shutdown()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    exit(main())
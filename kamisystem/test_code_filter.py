@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡密过滤器测试脚本
+在临时 SQLite 数据库（比较卡密区分大小写）中检查:
+- 用小写卡密探测一次之后，真实卡密仍能正常验证与查询状态（负缓存按原样记录）
+- 其他进程批量生成的卡密按页同步，每行只读一次，读完之后的同步不再重复读取
+- 晚提交的较小主键从主键空洞中补上
+
+示例:
+    python test_code_filter.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web'))
+
+REAL_CODE = "VIP-FILTER123456"
+
+class CodeFilterTester:
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.test_results = []
+    
+    def log_test(self, test_name, success, message=""):
+        """记录测试结果"""
+        self.test_results.append({"test": test_name, "success": success, "message": message})
+        status = "✓" if success else "✗"
+        print(f"{status} {test_name}: {message}")
+    
+    def add_cards(self, codes, first_id=None):
+        """绕过 code_filter.add_many 直接写入卡密，模拟其他进程生成"""
+        from models import db, Card
+        
+        cards = []
+        for i, full_code in enumerate(codes):
+            prefix, code = full_code.rsplit('-', 1)
+            card = Card(prefix=prefix, code=code, full_code=full_code)
+            if first_id is not None:
+                card.id = first_id + i
+            cards.append(card)
+        db.session.add_all(cards)
+        db.session.commit()
+    
+    def wait_ready(self):
+        """触发并等待过滤器构建完成"""
+        from utils.code_filter import code_filter
+        
+        code_filter.definitely_missing("WARMUP-000000")
+        deadline = time.monotonic() + 10
+        while not code_filter.ready and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return code_filter.ready
+    
+    def test_lowercase_probe(self):
+        """小写探测不应让真实卡密被负缓存拒绝"""
+        machine_code = "FILTER-MACHINE-001"
+        probe = self.client.post("/api/validate", json={"code": REAL_CODE.lower(), "machine_code": machine_code})
+        response = self.client.post("/api/validate", json={"code": REAL_CODE, "machine_code": machine_code})
+        status = self.client.get(f"/api/status/{REAL_CODE}")
+        self.log_test("小写探测后验证真实卡密", response.status_code == 200 and status.status_code == 200,
+                      f"探测 HTTP {probe.status_code}, 验证 HTTP {response.status_code}, "
+                      f"状态查询 HTTP {status.status_code}")
+    
+    def test_paged_sync(self):
+        """批量生成的卡密分页读取，读完后不再重复读取"""
+        from utils.code_filter import code_filter
+        
+        codes = [f"BULK-{i:06d}" for i in range(2500)]
+        self.add_cards(codes)
+        # 判定时同步读取第一页，最后一张卡密还没读到，按可能存在处理
+        missing_before = code_filter.definitely_missing(codes[-1])
+        reads = [code_filter.sync() for _ in range(4)]
+        found = not any(code_filter.definitely_missing(code) for code in codes)
+        self.log_test("分页同步", reads == [1000, 500, 0, 0] and found and not missing_before,
+                      f"每次读取 {reads}, 读完前判定不存在: {missing_before}, 全部可查: {found}")
+    
+    def test_late_commit(self):
+        """主键空洞中晚提交的卡密在下一次同步时补上"""
+        from models import db, Card
+        from utils.code_filter import code_filter
+        
+        max_id = db.session.execute(db.select(db.func.max(Card.id))).scalar()
+        self.add_cards(["LATE-B00002"], first_id=max_id + 2)
+        first = code_filter.sync()
+        self.add_cards(["LATE-A00001"], first_id=max_id + 1)
+        second = code_filter.sync()
+        found = not code_filter.definitely_missing("LATE-A00001")
+        self.log_test("晚提交补读", first == 1 and second == 1 and found,
+                      f"两次读取 {first}, {second}, 晚提交卡密可查: {found}")
+    
+    def run(self):
+        from models import db
+        from utils.code_filter import code_filter
+        
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            self.add_cards([REAL_CODE])
+            if not self.wait_ready():
+                self.log_test("过滤器构建", False, "10 秒内没有构建完成")
+                return
+            code_filter.sync_interval = 0
+            code_filter.load_chunk = 1000
+            
+            self.test_lowercase_probe()
+            self.test_paged_sync()
+            self.test_late_commit()
+
+def main():
+    """主函数"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_code_filter.db')
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from app import create_app
+    
+    tester = CodeFilterTester(create_app())
+    print("=" * 60)
+    print("卡密过滤器测试")
+    print("=" * 60)
+    tester.run()
+    
+    success_count = sum(1 for r in tester.test_results if r["success"])
+    total_count = len(tester.test_results)
+    print()
+    print(f"总测试数: {total_count}, 成功: {success_count}, 失败: {total_count - success_count}")
+    return 0 if success_count == total_count else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+卡密统计测试脚本
+在临时 SQLite 数据库中写入未使用、激活与已到期未标记的卡密，检查两种统计模式在过期清理前后的计数：
+- 非增量模式按实际状态计数，到期卡密在清理前已计入已过期
+- 增量模式按存储的状态计数，清理只把到期卡密从激活移到已过期，总数不变，并与重新查询校准的结果一致
+
+示例:
+    python test_stats.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web'))
+
+class StatsTester:
+    def __init__(self, app):
+        self.app = app
+        self.test_results = []
+    
+    def log_test(self, test_name, success, message=""):
+        """记录测试结果"""
+        self.test_results.append({"test": test_name, "success": success, "message": message})
+        status = "✓" if success else "✗"
+        print(f"{status} {test_name}: {message}")
+    
+    def seed(self):
+        """10 张卡密：4 张未使用、2 张激活未到期、4 张已到期但仍为激活状态"""
+        from models import db, Card, CardStatus
+        
+        now = datetime.utcnow()
+        cards = [Card(prefix='STAT', code=f"U{i}", full_code=f"STAT-U{i}", status=CardStatus.UNUSED)
+                 for i in range(4)]
+        cards += [Card(prefix='STAT', code=f"A{i}", full_code=f"STAT-A{i}", status=CardStatus.ACTIVE,
+                       machine_code=f"M-A{i}", expire_at=now + timedelta(hours=1)) for i in range(2)]
+        cards += [Card(prefix='STAT', code=f"O{i}", full_code=f"STAT-O{i}", status=CardStatus.ACTIVE,
+                       machine_code=f"M-O{i}", expire_at=now - timedelta(minutes=5)) for i in range(4)]
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(cards)
+        db.session.commit()
+    
+    def run_mode(self, incremental):
+        """在指定统计模式下执行一次过期清理，比较清理前后与校准后的计数"""
+        from utils.stats import card_stats
+        from utils.expiry import expire_due_cards
+        
+        mode = "增量模式" if incremental else "非增量模式"
+        self.app.config['STATS_INCREMENTAL'] = incremental
+        with self.app.app_context():
+            card_stats.init_app(self.app)
+            self.seed()
+            
+            before = card_stats.get_stats()
+            expected_expired = 0 if incremental else 4
+            self.log_test(f"{mode}清理前", before['total'] == 10 and before['expired'] == expected_expired,
+                          f"总数 {before['total']}, 激活 {before['active']}, 已过期 {before['expired']}")
+            
+            updated, _ = expire_due_cards()
+            after = card_stats.get_stats()
+            self.log_test(f"{mode}清理后", updated == 4 and after['total'] == 10 and after['expired'] == 4
+                          and after['active'] == 2,
+                          f"标记 {updated} 张, 总数 {after['total']}, 激活 {after['active']}, 已过期 {after['expired']}")
+            
+            card_stats.invalidate()
+            reconciled = card_stats.get_stats()
+            self.log_test(f"{mode}校准", reconciled == after, f"重新查询 {reconciled}")
+
+def main():
+    """主函数"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_stats.db')
+    
+    import logging
+    logging.disable(logging.WARNING)
+    
+    from app import create_app
+    
+    tester = StatsTester(create_app())
+    print("=" * 60)
+    print("卡密统计测试")
+    print("=" * 60)
+    tester.run_mode(incremental=False)
+    tester.run_mode(incremental=True)
+    
+    success_count = sum(1 for r in tester.test_results if r["success"])
+    total_count = len(tester.test_results)
+    print()
+    print(f"总测试数: {total_count}, 成功: {success_count}, 失败: {total_count - success_count}")
+    return 0 if success_count == total_count else 1
+
+if __name__ == "__main__":
+    exit(main())
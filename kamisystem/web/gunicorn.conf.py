@@ -0,0 +1,67 @@
+"""
+gunicorn 配置
+    
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+工作进程数 WEB_WORKERS、每个进程的线程数 WEB_THREADS、数据库连接池 DB_POOL_SIZE/DB_MAX_OVERFLOW
+均由环境变量决定，连接池大小不小于线程数（见 utils/serving.py）。
+数据库总连接数约为 WEB_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW)，需小于 MySQL 的 max_connections。
+
+定时任务只在主进程中启动：工作进程被回收重启或数量调整时都不会重复执行清理任务。
+"""
+
+import os
+from utils.serving import load_serving_config, scheduler_enabled
+
+serving = load_serving_config()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = serving.workers
+threads = serving.threads
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# 处理一定数量的请求后重启工作进程，0 表示不重启
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+def when_ready(server):
+    """主进程就绪（尚未创建工作进程）：创建数据库表、执行迁移并启动定时任务"""
+    from app import create_app, setup_scheduler
+    from models import db
+    from utils.metrics import metrics
+    from utils.migrations import upgrade
+    
+    # 清除上一次运行留下的指标快照，之后由各进程重新写入
+    if os.environ.get('METRICS_DIR'):
+        metrics.clear_directory(os.environ['METRICS_DIR'])
+    
+    app = create_app()
+    with app.app_context():
+        if app.config['DB_AUTO_MIGRATE']:
+            executed = upgrade()
+            if executed:
+                server.log.info(f"已执行数据库迁移: {', '.join(executed)}")
+        else:
+            db.create_all()
+        # 主进程不处理请求，归还建表时使用的连接
+        db.engine.dispose()
+    server.kami_app = app
+    
+    server.log.info(f"服务参数: 进程={serving.workers}, 线程={serving.threads}, "
+                    f"连接池={serving.pool_size}+{serving.max_overflow}")
+    
+    if scheduler_enabled():
+        setup_scheduler(app)
+    else:
+        server.log.info("ENABLE_SCHEDULER=False，未启动定时任务")
+
+def post_fork(server, worker):
+    """工作进程不复用主进程（定时任务）打开的数据库连接"""
+    app = getattr(server, 'kami_app', None)
+    if app is not None:
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -1,150 +1,274 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
-from enum import Enum
-import random
-import string
-import pytz
-
-db = SQLAlchemy()
-
-# 设置上海时区
-SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
-
-def get_current_time():
-    """获取当前上海时间"""
-    return datetime.now(SHANGHAI_TZ)
-
-def get_utc_time():
-    """获取UTC时间（用于数据库存储）"""
-    return datetime.utcnow()
-
-class CardStatus(Enum):
-    UNUSED = 'UNUSED'
-    ACTIVE = 'ACTIVE'
-    EXPIRED = 'EXPIRED'
-    
-    @classmethod
-    def from_string(cls, value):
-        """从字符串创建枚举值"""
-        if isinstance(value, str):
-            value = value.upper()
-            for status in cls:
-                if status.value == value:
-                    return status
-        elif isinstance(value, cls):
-            return value
-        raise ValueError(f"Invalid status value: {value}")
-
-class Card(db.Model):
-    __tablename__ = 'cards'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    prefix = db.Column(db.String(16), nullable=False)
-    code = db.Column(db.String(64), nullable=False)
-    full_code = db.Column(db.String(128), nullable=False, unique=True)
-    used_at = db.Column(db.DateTime, default=None)
-    expire_at = db.Column(db.DateTime, default=None)
-    machine_code = db.Column(db.String(128), default=None)
-    status = db.Column(db.Enum(CardStatus), default=CardStatus.UNUSED)
-    created_at = db.Column(db.DateTime, default=get_utc_time)
-    updated_at = db.Column(db.DateTime, default=get_utc_time, onupdate=get_utc_time)
-    
-    def __repr__(self):
-        return f'<Card {self.full_code}>'
-    
-    def activate(self, machine_code):
-        """激活卡密"""
-        try:
-            self.status = CardStatus.ACTIVE
-            self.machine_code = machine_code
-            self.used_at = get_utc_time()
-            self.expire_at = get_utc_time() + timedelta(hours=3)
-            self.updated_at = get_utc_time()
-            return True
-        except Exception as e:
-            return False
-    
-    def is_expired(self):
-        """检查是否过期"""
-        if self.expire_at is None:
-            return False
-        return get_utc_time() > self.expire_at
-    
-    def check_and_update_status(self):
-        """检查并更新状态"""
-        if self.status == CardStatus.ACTIVE and self.is_expired():
-            self.status = CardStatus.EXPIRED
-            self.updated_at = get_utc_time()
-            return True
-        return False
-    
-    def to_dict(self):
-        """转换为字典"""
-        def to_shanghai_time(dt):
-            if dt is None:
-                return None
-            return dt.replace(tzinfo=pytz.UTC).astimezone(SHANGHAI_TZ).isoformat()
-        
-        return {
-            'id': self.id,
-            'prefix': self.prefix,
-            'code': self.code,
-            'full_code': self.full_code,
-            'used_at': to_shanghai_time(self.used_at),
-            'expire_at': to_shanghai_time(self.expire_at),
-            'machine_code': self.machine_code,
-            'status': self.status.value,
-            'created_at': to_shanghai_time(self.created_at),
-            'updated_at': to_shanghai_time(self.updated_at)
-        }
-    
-    @classmethod
-    def generate_random_code(cls, length=10):
-        """生成随机代码"""
-        characters = string.ascii_uppercase + string.digits
-        return ''.join(random.choice(characters) for _ in range(length))
-    
-    @classmethod
-    def create_card(cls, prefix, code_length=10):
-        """创建新卡密"""
-        max_attempts = 100
-        for _ in range(max_attempts):
-            code = cls.generate_random_code(code_length)
-            full_code = f"{prefix}-{code}"
-            
-            # 检查是否重复
-            if not cls.query.filter_by(full_code=full_code).first():
-                card = cls(
-                    prefix=prefix,
-                    code=code,
-                    full_code=full_code
-                )
-                return card
-        
-        raise Exception("无法生成唯一的卡密代码")
-    
-    @staticmethod
-    def get_status_display(status):
-        """获取状态显示文本"""
-        if isinstance(status, str):
-            status = CardStatus.from_string(status)
-        
-        status_map = {
-            CardStatus.UNUSED: '未使用',
-            CardStatus.ACTIVE: '已激活',
-            CardStatus.EXPIRED: '已过期'
-        }
-        return status_map.get(status, '未知')
-    
-    @staticmethod
-    def get_status_color(status):
-        """获取状态颜色"""
-        if isinstance(status, str):
-            status = CardStatus.from_string(status)
-        
-        color_map = {
-            CardStatus.UNUSED: 'success',
-            CardStatus.ACTIVE: 'primary',
-            CardStatus.EXPIRED: 'danger'
-        }
-        return color_map.get(status, 'secondary')
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+from enum import Enum
+import random
+import string
+from utils.card_cache import card_cache
+from utils.serialization import SHANGHAI_TZ, shanghai_isoformat
+from utils.db_routing import RoutingSession
+
+# 会话按读写分离路由，见 utils/db_routing.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# 卡密激活后的有效期
+ACTIVATION_PERIOD = timedelta(hours=3)
+
+def get_current_time():
+    """获取当前上海时间"""
+    return datetime.now(SHANGHAI_TZ)
+
+def get_utc_time():
+    """获取UTC时间（用于数据库存储）"""
+    return datetime.utcnow()
+
+class CardStatus(Enum):
+    UNUSED = 'UNUSED'
+    ACTIVE = 'ACTIVE'
+    EXPIRED = 'EXPIRED'
+    
+    @classmethod
+    def from_string(cls, value):
+        """从字符串创建枚举值"""
+        if isinstance(value, str):
+            value = value.upper()
+            for status in cls:
+                if status.value == value:
+                    return status
+        elif isinstance(value, cls):
+            return value
+        raise ValueError(f"Invalid status value: {value}")
+
+def effective_status(status, expire_at, now=None):
+    """根据存储的状态和过期时间计算实际状态
+    
+    卡密到期后由后台过期调度器标记为过期，在此之前读取路径按此函数判断，不写数据库。
+    """
+    if status == CardStatus.ACTIVE and expire_at is not None and (now or get_utc_time()) > expire_at:
+        return CardStatus.EXPIRED
+    return status
+
+class Card(db.Model):
+    """卡密
+    
+    索引按查询模式建立，修改后需在 utils/migrations.py 中增加迁移，已有数据库执行迁移后才会生效:
+    - idx_status / idx_prefix: 管理列表只按状态或只按前缀筛选，按主键分页（索引隐含主键，无需排序）
+    - idx_status_prefix_id: 管理列表同时按状态与前缀筛选，按主键分页；未使用卡密按前缀计数
+    - idx_status_prefix_created_at: 导出未使用卡密（status=UNUSED AND prefix=? ORDER BY created_at），覆盖 full_code 不回表
+    - idx_status_expire_at: 过期清理、过期调度器载入与逾期统计（status=ACTIVE AND expire_at<?）
+    - idx_machine_code: 按机器码搜索
+    """
+    __tablename__ = 'cards'
+    __table_args__ = (
+        db.Index('idx_status', 'status'),
+        db.Index('idx_prefix', 'prefix'),
+        db.Index('idx_machine_code', 'machine_code'),
+        db.Index('idx_status_prefix_id', 'status', 'prefix', 'id'),
+        db.Index('idx_status_prefix_created_at', 'status', 'prefix', 'created_at', 'full_code'),
+        db.Index('idx_status_expire_at', 'status', 'expire_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    prefix = db.Column(db.String(16), nullable=False)
+    code = db.Column(db.String(64), nullable=False)
+    full_code = db.Column(db.String(128), nullable=False, unique=True)
+    used_at = db.Column(db.DateTime, default=None)
+    expire_at = db.Column(db.DateTime, default=None)
+    machine_code = db.Column(db.String(128), default=None)
+    status = db.Column(db.Enum(CardStatus), default=CardStatus.UNUSED)
+    created_at = db.Column(db.DateTime, default=get_utc_time)
+    updated_at = db.Column(db.DateTime, default=get_utc_time, onupdate=get_utc_time)
+    
+    def __repr__(self):
+        return f'<Card {self.full_code}>'
+    
+    def activate(self, machine_code):
+        """激活卡密"""
+        try:
+            # 状态即将变化，先让缓存中的旧快照失效
+            card_cache.invalidate(self.full_code)
+            self.status = CardStatus.ACTIVE
+            self.machine_code = machine_code
+            self.used_at = get_utc_time()
+            self.expire_at = get_utc_time() + ACTIVATION_PERIOD
+            self.updated_at = get_utc_time()
+            return True
+        except Exception as e:
+            return False
+    
+    @classmethod
+    def activation_statement(cls, full_code, machine_code, now=None):
+        """构造首次激活的条件 UPDATE 语句，返回 (语句, 过期时间)
+        
+        仅当卡密仍处于未使用状态时才会写入，并发请求中只有一个能成功（rowcount 为 1）。
+        同步接口与异步服务共用此语句。
+        """
+        now = now or get_utc_time()
+        expire_at = now + ACTIVATION_PERIOD
+        statement = (
+            db.update(cls)
+            .where(cls.full_code == full_code, cls.status == CardStatus.UNUSED)
+            .values(
+                status=CardStatus.ACTIVE,
+                machine_code=machine_code,
+                used_at=now,
+                expire_at=expire_at,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return statement, expire_at
+    
+    @classmethod
+    def snapshot_statement(cls, full_code):
+        """读取验证所需字段（状态、绑定的机器码、过期时间）的语句，走 full_code 唯一索引
+        
+        同步接口与异步服务共用此语句。
+        """
+        return db.select(cls.status, cls.machine_code, cls.expire_at).where(cls.full_code == full_code)
+    
+    @classmethod
+    def activate_atomic(cls, full_code, machine_code):
+        """以单条条件 UPDATE 激活卡密
+        
+        成功返回过期时间；卡密不存在或已被激活时返回 None，由调用方提交事务。
+        """
+        statement, expire_at = cls.activation_statement(full_code, machine_code)
+        result = db.session.execute(statement)
+        if result.rowcount != 1:
+            return None
+        card_cache.invalidate(full_code)
+        return expire_at
+    
+    def is_expired(self):
+        """检查是否过期"""
+        if self.expire_at is None:
+            return False
+        return get_utc_time() > self.expire_at
+    
+    @property
+    def effective_status(self):
+        """读取时计算的实际状态，已到期但尚未被后台标记的激活卡密视为已过期"""
+        return effective_status(self.status, self.expire_at)
+    
+    @classmethod
+    def effective_status_filter(cls, status, now=None):
+        """按实际状态筛选的查询条件，与 effective_status 一致"""
+        now = now or get_utc_time()
+        if status == CardStatus.ACTIVE:
+            return db.and_(cls.status == CardStatus.ACTIVE,
+                           db.or_(cls.expire_at.is_(None), cls.expire_at >= now))
+        if status == CardStatus.EXPIRED:
+            return db.or_(cls.status == CardStatus.EXPIRED,
+                          db.and_(cls.status == CardStatus.ACTIVE, cls.expire_at < now))
+        return cls.status == status
+    
+    def check_and_update_status(self):
+        """检查并更新状态（写入数据库，读取路径应使用 effective_status）"""
+        if self.status == CardStatus.ACTIVE and self.is_expired():
+            self.status = CardStatus.EXPIRED
+            self.updated_at = get_utc_time()
+            return True
+        return False
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'prefix': self.prefix,
+            'code': self.code,
+            'full_code': self.full_code,
+            'used_at': shanghai_isoformat(self.used_at),
+            'expire_at': shanghai_isoformat(self.expire_at),
+            'machine_code': self.machine_code,
+            'status': self.effective_status.value,
+            'created_at': shanghai_isoformat(self.created_at),
+            'updated_at': shanghai_isoformat(self.updated_at)
+        }
+    
+    @classmethod
+    def generate_random_code(cls, length=10):
+        """生成随机代码"""
+        characters = string.ascii_uppercase + string.digits
+        return ''.join(random.choices(characters, k=length))
+    
+    @classmethod
+    def create_card(cls, prefix, code_length=10):
+        """创建新卡密"""
+        max_attempts = 100
+        for _ in range(max_attempts):
+            code = cls.generate_random_code(code_length)
+            full_code = f"{prefix}-{code}"
+            
+            # 检查是否重复
+            if not cls.query.filter_by(full_code=full_code).first():
+                card = cls(
+                    prefix=prefix,
+                    code=code,
+                    full_code=full_code
+                )
+                return card
+        
+        raise Exception("无法生成唯一的卡密代码")
+    
+    @staticmethod
+    def get_status_display(status):
+        """获取状态显示文本"""
+        if isinstance(status, str):
+            status = CardStatus.from_string(status)
+        
+        status_map = {
+            CardStatus.UNUSED: '未使用',
+            CardStatus.ACTIVE: '已激活',
+            CardStatus.EXPIRED: '已过期'
+        }
+        return status_map.get(status, '未知')
+    
+    @staticmethod
+    def get_status_color(status):
+        """获取状态颜色"""
+        if isinstance(status, str):
+            status = CardStatus.from_string(status)
+        
+        color_map = {
+            CardStatus.UNUSED: 'success',
+            CardStatus.ACTIVE: 'primary',
+            CardStatus.EXPIRED: 'danger'
+        }
+        return color_map.get(status, 'secondary')
+
+class SchemaMigration(db.Model):
+    """已执行的数据库迁移，见 utils/migrations.py"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.String(32), primary_key=True)
+    description = db.Column(db.String(128), nullable=False)
+    applied_at = db.Column(db.DateTime, default=get_utc_time)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+class CardSearchGram(db.Model):
+    """卡密代码的 n-gram 索引，用于子串搜索"""
+    __tablename__ = 'card_search_grams'
+    __table_args__ = (
+        db.Index('idx_card_id', 'card_id'),
+    )
+    
+    gram = db.Column(db.String(8), primary_key=True)
+    card_id = db.Column(db.Integer, db.ForeignKey('cards.id', ondelete='CASCADE'), primary_key=True)
+    
+    def __repr__(self):
+        return f'<CardSearchGram {self.gram} -> {self.card_id}>'
+
+class CardMachineGram(db.Model):
+    """已绑定机器码的 n-gram 索引，用于机器码子串搜索，卡密激活时写入"""
+    __tablename__ = 'card_machine_grams'
+    __table_args__ = (
+        db.Index('idx_machine_gram_card_id', 'card_id'),
+    )
+    
+    gram = db.Column(db.String(8), primary_key=True)
+    card_id = db.Column(db.Integer, db.ForeignKey('cards.id', ondelete='CASCADE'), primary_key=True)
+    
+    def __repr__(self):
+        return f'<CardMachineGram {self.gram} -> {self.card_id}>'
@@ -1,148 +1,276 @@
-from flask import Blueprint, request, jsonify
-from models import db, Card, CardStatus, get_utc_time, SHANGHAI_TZ
-from datetime import datetime
-import logging
-import pytz
-
-api = Blueprint('api', __name__)
-
-# 配置日志
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-@api.route('/validate', methods=['POST'])
-def validate_card():
-    """卡密验证API"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'status': 'error', 'message': '无效的JSON数据'}), 400
-        
-        code = data.get('code', '').strip()
-        machine_code = data.get('machine_code', '').strip()
-        
-        if not code or not machine_code:
-            return jsonify({'status': 'error', 'message': '卡密和机器码不能为空'}), 400
-        
-        # 查找卡密
-        card = Card.query.filter_by(full_code=code).first()
-        
-        if not card:
-            logger.warning(f"卡密不存在: {code}")
-            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
-        
-        # 检查并更新过期状态
-        card.check_and_update_status()
-        
-        # 验证卡密状态
-        if card.status == CardStatus.UNUSED:
-            # 首次使用，激活卡密
-            if card.activate(machine_code):
-                db.session.commit()
-                logger.info(f"卡密首次激活: {code} -> 机器码: {machine_code}")
-                
-                # 转换时间到上海时区
-                expire_at_shanghai = card.expire_at.replace(tzinfo=pytz.UTC).astimezone(SHANGHAI_TZ)
-                
-                return jsonify({
-                    'status': 'success',
-                    'message': '授权成功',
-                    'expire_at': expire_at_shanghai.isoformat(),
-                    'remaining_hours': 3
-                }), 200
-            else:
-                db.session.rollback()
-                return jsonify({'status': 'error', 'message': '卡密激活失败'}), 500
-                
-        elif card.status == CardStatus.ACTIVE:
-            # 检查机器码是否匹配
-            if card.machine_code != machine_code:
-                logger.warning(f"机器码不匹配: {code} -> 期望: {card.machine_code}, 实际: {machine_code}")
-                return jsonify({'status': 'error', 'message': '机器码不匹配'}), 403
-            
-            # 检查是否过期
-            if card.is_expired():
-                card.status = CardStatus.EXPIRED
-                db.session.commit()
-                logger.info(f"卡密已过期: {code}")
-                return jsonify({'status': 'error', 'message': '卡密已过期'}), 403
-            
-            # 计算剩余时间
-            remaining_time = card.expire_at - get_utc_time()
-            remaining_hours = remaining_time.total_seconds() / 3600
-            
-            # 转换时间到上海时区
-            expire_at_shanghai = card.expire_at.replace(tzinfo=pytz.UTC).astimezone(SHANGHAI_TZ)
-            
-            logger.info(f"卡密验证成功: {code} -> 剩余时间: {remaining_hours:.2f}小时")
-            return jsonify({
-                'status': 'success',
-                'message': '授权成功',
-                'expire_at': expire_at_shanghai.isoformat(),
-                'remaining_hours': round(remaining_hours, 2)
-            }), 200
-            
-        elif card.status == CardStatus.EXPIRED:
-            logger.warning(f"卡密已过期: {code}")
-            return jsonify({'status': 'error', 'message': '卡密已过期'}), 403
-        
-        else:
-            return jsonify({'status': 'error', 'message': '未知的卡密状态'}), 500
-            
-    except Exception as e:
-        logger.error(f"验证卡密时发生错误: {str(e)}")
-        db.session.rollback()
-        return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
-
-@api.route('/status/<code>', methods=['GET'])
-def get_card_status(code):
-    """获取卡密状态"""
-    try:
-        card = Card.query.filter_by(full_code=code).first()
-        
-        if not card:
-            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
-        
-        # 检查并更新过期状态
-        card.check_and_update_status()
-        db.session.commit()
-        
-        # 转换时间到上海时区
-        def to_shanghai_time(dt):
-            if dt is None:
-                return None
-            return dt.replace(tzinfo=pytz.UTC).astimezone(SHANGHAI_TZ).isoformat()
-        
-        result = {
-            'status': 'success',
-            'data': {
-                'full_code': card.full_code,
-                'status': card.status.value,
-                'created_at': to_shanghai_time(card.created_at),
-                'used_at': to_shanghai_time(card.used_at),
-                'expire_at': to_shanghai_time(card.expire_at),
-                'machine_code': card.machine_code
-            }
-        }
-        
-        # 如果是活跃状态，添加剩余时间信息
-        if card.status == CardStatus.ACTIVE and card.expire_at:
-            remaining_time = card.expire_at - get_utc_time()
-            result['data']['remaining_hours'] = round(remaining_time.total_seconds() / 3600, 2)
-        
-        return jsonify(result), 200
-        
-    except Exception as e:
-        logger.error(f"获取卡密状态时发生错误: {str(e)}")
-        return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
-
-@api.route('/health', methods=['GET'])
-def health_check():
-    """健康检查"""
-    current_time = datetime.now(SHANGHAI_TZ)
-    return jsonify({
-        'status': 'ok',
-        'timestamp': current_time.isoformat(),
-        'service': 'kamisystem'
-    }), 200
+from flask import Blueprint, request, jsonify, current_app
+from models import db, Card, CardStatus, get_utc_time, SHANGHAI_TZ, ACTIVATION_PERIOD
+from utils.card_cache import card_cache
+from utils.stats import card_stats
+from utils.expiry import expiry_scheduler
+from utils.db_routing import replica_reads, mark_written
+from utils.code_filter import code_filter
+from utils.rate_limit import rate_limiter
+from utils.license_token import license_signer
+from utils.search import index_machine_code
+from utils.validation import (success_payload, check_card, check_cached, status_payload, validation_outcomes,
+                              validation_flight)
+from datetime import datetime
+import logging
+
+api = Blueprint('api', __name__)
+
+logger = logging.getLogger(__name__)
+
+@api.before_request
+def throttle():
+    """按客户端 IP 与机器码限流，在任何数据库操作之前返回 429"""
+    if request.endpoint == 'api.health_check':
+        return None
+    
+    machine_code = None
+    cost = 1
+    if request.endpoint == 'api.validate_card':
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            machine_code = str(data.get('machine_code') or '').strip()
+    elif request.endpoint == 'api.validate_cards_batch':
+        # 批量验证按卡密数量消耗 IP 令牌
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else None
+        if isinstance(items, list):
+            cost = max(len(items), 1)
+    
+    retry_after = rate_limiter.check(request.remote_addr, machine_code, cost)
+    if retry_after is not None:
+        return jsonify({'status': 'error', 'message': '请求过于频繁，请稍后再试'}), 429, \
+            {'Retry-After': str(retry_after)}
+    return None
+
+def load_for_validation(code, machine_code):
+    """激活或读取卡密，返回 (是否由本次激活, 状态, 绑定的机器码, 过期时间)，卡密不存在时返回 None
+    
+    首次使用：条件更新直接激活，只有在抢占失败时才读取卡密。
+    """
+    expire_at = Card.activate_atomic(code, machine_code)
+    if expire_at:
+        index_machine_code(code, machine_code)
+        db.session.commit()
+        card_cache.put(code, CardStatus.ACTIVE.value, machine_code, expire_at)
+        mark_written(code)
+        card_stats.record_activated()
+        expiry_scheduler.schedule(code, expire_at)
+        return True, CardStatus.ACTIVE, machine_code, expire_at
+    
+    row = db.session.execute(Card.snapshot_statement(code)).first()
+    # 条件更新没有匹配到行，立即结束事务，不把它可能持有的锁留到请求结束（合并的请求都在等待这次读取）
+    db.session.rollback()
+    if row is None:
+        code_filter.remember_missing(code)
+        return None
+    return False, row.status, row.machine_code, row.expire_at
+
+@api.route('/validate', methods=['POST'])
+@validation_outcomes.timed()
+def validate_card():
+    """卡密验证API"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            validation_outcomes.record('invalid')
+            return jsonify({'status': 'error', 'message': '无效的JSON数据'}), 400
+        
+        code = data.get('code', '').strip()
+        machine_code = data.get('machine_code', '').strip()
+        # 客户端请求离线授权令牌（服务端配置了签名密钥时返回 license_token）
+        token = bool(data.get('token'))
+        
+        if not code or not machine_code:
+            validation_outcomes.record('invalid', code)
+            return jsonify({'status': 'error', 'message': '卡密和机器码不能为空'}), 400
+        
+        now = get_utc_time()
+        payload = check_cached(code, machine_code, now, token)
+        if payload:
+            return jsonify(payload), 200
+        
+        # 一定不存在的卡密（布隆过滤器/负缓存）不查询数据库
+        if code_filter.definitely_missing(code):
+            validation_outcomes.record('not_found', code)
+            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
+        
+        # 同一卡密的并发请求只由一个请求激活/查询数据库，其余请求共用它读到的卡密状态
+        snapshot, shared = validation_flight.do(code, lambda: load_for_validation(code, machine_code))
+        if snapshot is None:
+            validation_outcomes.record('not_found', code)
+            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
+        
+        activated, status, bound_machine_code, expire_at = snapshot
+        if activated and not shared:
+            validation_outcomes.record('activated', code)
+            logger.info("卡密首次激活: %s -> 机器码: %s", code, machine_code)
+            return jsonify(success_payload(expire_at, expire_at - ACTIVATION_PERIOD,
+                                           token_for=(code, machine_code) if token else None)), 200
+        
+        # 验证卡密状态：到期的卡密按过期处理，状态由后台过期调度器写入
+        payload, http_status = check_card(code, machine_code, status, bound_machine_code, expire_at, now, token)
+        if http_status == 200:
+            card_cache.put(code, status.value, bound_machine_code, expire_at)
+        return jsonify(payload), http_status
+            
+    except Exception as e:
+        logger.error(f"验证卡密时发生错误: {str(e)}")
+        validation_outcomes.record('error')
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
+
+@api.route('/validate/batch', methods=['POST'])
+def validate_cards_batch():
+    """批量卡密验证API
+    
+    请求体为 {"items": [{"code": ..., "machine_code": ...}, ...]}，
+    一次 IN 查询读取全部卡密，激活在同一事务内以条件更新完成，结果按请求顺序返回。
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'status': 'error', 'message': '无效的JSON数据'}), 400
+        
+        max_size = current_app.config.get('VALIDATE_BATCH_MAX', 100)
+        if len(items) > max_size:
+            return jsonify({'status': 'error', 'message': f'单次最多验证 {max_size} 个卡密'}), 413
+        
+        now = get_utc_time()
+        results = [None] * len(items)
+        pending = []
+        
+        for index, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            code = str(item.get('code') or '').strip()
+            machine_code = str(item.get('machine_code') or '').strip()
+            
+            if not code or not machine_code:
+                validation_outcomes.record('invalid', code)
+                results[index] = ({'status': 'error', 'message': '卡密和机器码不能为空'}, 400)
+                continue
+            
+            payload = check_cached(code, machine_code, now)
+            if payload:
+                results[index] = (payload, 200)
+            else:
+                pending.append((index, code, machine_code))
+        
+        if pending:
+            # 一次查询读取所有未命中缓存的卡密
+            rows = db.session.execute(
+                db.select(Card.full_code, Card.status, Card.machine_code, Card.expire_at)
+                .where(Card.full_code.in_({code for _, code, _ in pending}))
+            ).all()
+            snapshots = {row.full_code: (row.status, row.machine_code, row.expire_at) for row in rows}
+            
+            activated = []
+            for index, code, machine_code in pending:
+                snapshot = snapshots.get(code)
+                if snapshot is None:
+                    validation_outcomes.record('not_found', code)
+                    results[index] = ({'status': 'error', 'message': '卡密不存在'}, 404)
+                    continue
+                
+                status, bound_machine_code, expire_at = snapshot
+                if status == CardStatus.UNUSED:
+                    expire_at = Card.activate_atomic(code, machine_code)
+                    if expire_at:
+                        index_machine_code(code, machine_code)
+                        snapshots[code] = (CardStatus.ACTIVE, machine_code, expire_at)
+                        activated.append((code, machine_code, expire_at))
+                        validation_outcomes.record('activated', code)
+                        logger.info("卡密首次激活: %s -> 机器码: %s", code, machine_code)
+                        results[index] = (success_payload(expire_at, expire_at - ACTIVATION_PERIOD), 200)
+                        continue
+                    
+                    # 被其他请求抢先激活，重新读取该卡密
+                    row = db.session.execute(Card.snapshot_statement(code)).first()
+                    if row is None:
+                        validation_outcomes.record('not_found', code)
+                        results[index] = ({'status': 'error', 'message': '卡密不存在'}, 404)
+                        continue
+                    status, bound_machine_code, expire_at = row
+                    snapshots[code] = (status, bound_machine_code, expire_at)
+                
+                results[index] = check_card(code, machine_code, status, bound_machine_code, expire_at, now)
+            
+            if activated:
+                db.session.commit()
+                card_stats.record_activated(len(activated))
+            else:
+                # 没有激活任何卡密，结束条件更新与读取所在的事务
+                db.session.rollback()
+            mark_written(*(code for code, _, _ in activated))
+            for code, machine_code, expire_at in activated:
+                card_cache.put(code, CardStatus.ACTIVE.value, machine_code, expire_at)
+                expiry_scheduler.schedule(code, expire_at)
+        
+        response_items = []
+        for item, (payload, http_status) in zip(items, results):
+            code = item.get('code') if isinstance(item, dict) else None
+            response_items.append(dict(payload, code=code, http_status=http_status))
+        
+        return jsonify({'status': 'success', 'results': response_items}), 200
+    
+    except Exception as e:
+        logger.error(f"批量验证卡密时发生错误: {str(e)}")
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
+
+@api.route('/status/<code>', methods=['GET'])
+def get_card_status(code):
+    """获取卡密状态
+    
+    配置从库时从从库读取；从库上卡密不存在或仍未使用时可能是复制延迟（刚生成或刚激活），
+    改为从主库再读一次。
+    """
+    try:
+        if code_filter.definitely_missing(code):
+            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
+        
+        stmt = (
+            db.select(Card.full_code, Card.status, Card.created_at, Card.used_at,
+                      Card.expire_at, Card.machine_code)
+            .where(Card.full_code == code)
+        )
+        with replica_reads(code) as from_replica:
+            card = db.session.execute(stmt).first()
+        if from_replica and (card is None or card.status == CardStatus.UNUSED):
+            card = db.session.execute(stmt).first()
+        
+        if not card:
+            code_filter.remember_missing(code)
+            return jsonify({'status': 'error', 'message': '卡密不存在'}), 404
+        
+        # 只读查询：过期状态在读取时计算，不写数据库
+        result = status_payload(card.full_code, card.status, card.created_at, card.used_at,
+                                card.expire_at, card.machine_code, get_utc_time())
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        logger.error(f"获取卡密状态时发生错误: {str(e)}")
+        return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
+
+@api.route('/license-keys', methods=['GET'])
+def license_keys():
+    """离线授权令牌的公钥列表，轮换期间同时包含新旧密钥"""
+    return jsonify({
+        'status': 'success',
+        'enabled': license_signer.enabled,
+        'active_key_id': license_signer.active_kid,
+        'keys': license_signer.public_keys()
+    }), 200
+
+@api.route('/health', methods=['GET'])
+def health_check():
+    """健康检查"""
+    current_time = datetime.now(SHANGHAI_TZ)
+    return jsonify({
+        'status': 'ok',
+        'timestamp': current_time.isoformat(),
+        'service': 'kamisystem'
+    }), 200
@@ -0,0 +1,140 @@
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from utils.serialization import shanghai_isoformat
+import os
+import threading
+import time
+
+# 缓存中保存的卡密快照，status 为 CardStatus 的字符串值，expire_at_iso 为预先格式化的上海时间
+CachedCard = namedtuple('CachedCard', ['status', 'machine_code', 'expire_at', 'expire_at_iso'])
+
+class LRUTTLCache:
+    """线程安全的 LRU + TTL 缓存
+    
+    容量满时淘汰最久未使用的条目，条目超过 TTL 后视为未命中。
+    缓存只存在于当前进程内，多进程部署时其他进程的修改最多在 TTL 内不可见。
+    """
+    
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # fork 时其他线程（如主进程中的过期调度器）可能正持有锁
+            os.register_at_fork(after_in_child=self._after_fork)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+    
+    def configure(self, max_size=None, ttl=None):
+        """调整容量和过期时间，并清空现有条目"""
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+    
+    def get(self, key):
+        """读取条目，不存在或已过期返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, deadline = item
+            if deadline <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value, ttl=None):
+        """写入条目，ttl 为空时使用默认过期时间"""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        deadline = time.monotonic() + ttl
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, deadline)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, key):
+        """删除单个条目"""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+    
+    def invalidate_many(self, keys):
+        """批量删除条目"""
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        """返回命中/未命中/淘汰计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class CardCache(LRUTTLCache):
+    """热点卡密缓存，按 full_code 保存状态、机器码和过期时间"""
+    
+    def init_app(self, app):
+        """从应用配置读取缓存参数"""
+        self.configure(
+            max_size=app.config.get('CARD_CACHE_SIZE', 10000),
+            ttl=app.config.get('CARD_CACHE_TTL', 60)
+        )
+    
+    def put(self, full_code, status, machine_code, expire_at, now=None):
+        """写入卡密快照，条目寿命不会超过卡密本身的过期时间"""
+        ttl = None
+        expire_at_iso = None
+        if expire_at is not None:
+            now = now or datetime.utcnow()
+            ttl = (expire_at - now).total_seconds()
+            expire_at_iso = shanghai_isoformat(expire_at)
+        self.set(full_code, CachedCard(status, machine_code, expire_at, expire_at_iso), ttl)
+    
+    def put_card(self, card):
+        """写入 Card 对象的快照"""
+        self.put(card.full_code, card.status.value, card.machine_code, card.expire_at)
+
+# 全局缓存实例
+card_cache = CardCache()
@@ -0,0 +1,319 @@
+from models import db, Card, get_utc_time
+from datetime import timedelta
+from utils.card_cache import LRUTTLCache
+from utils.metrics import metrics
+from collections import deque
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_CODE_REJECTIONS = metrics.counter(
+    'kami_unknown_code_rejections_total', '未查询数据库直接判定为不存在的卡密数量，source 为 bloom 或 negative_cache',
+    ('source',))
+
+def code_key(full_code):
+    """布隆过滤器中的键：卡密代码中最后一个 '-' 之后的随机部分
+    
+    编辑卡密只会修改前缀，随机部分不变，因此编辑后不需要在各进程间同步过滤器，
+    只有新生成的卡密需要同步（见 CodeFilter.sync）。
+    MySQL 的 utf8mb4_unicode_ci 排序规则比较卡密时不区分大小写，键统一转为大写，
+    查询与登记使用同一规则。折叠大小写只会让过滤器多判"可能存在"，不会误拒；
+    负缓存记录的是按原样查询的结果，不使用这个键（见 CodeFilter.remember_missing）。
+    """
+    return full_code.rsplit('-', 1)[-1].upper()
+
+class BloomFilter:
+    """按容量与误判率确定大小的布隆过滤器，不支持删除"""
+    
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def _positions(self, key):
+        # 双重哈希: 由一次 blake2b 得到两个 64 位哈希值，组合出 hash_count 个位置
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+    
+    def add(self, key):
+        """加入一个键，count 只统计此前不存在的键（重复加入不计数）"""
+        positions = self._positions(key)
+        bits = self.bits
+        with self._lock:
+            added = False
+            for position in positions:
+                mask = 1 << (position & 7)
+                if not bits[position >> 3] & mask:
+                    bits[position >> 3] |= mask
+                    added = True
+            if added:
+                self.count += 1
+    
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+class CodeFilter:
+    """拒绝不存在的卡密，不查询数据库
+    
+    布隆过滤器保存全部卡密代码，在进程处理第一个请求时由后台线程流式读取 cards 表构建，
+    构建完成前所有卡密都按可能存在处理。过滤器判定不存在的卡密一定不存在，
+    可能存在的卡密继续查询数据库；查询后仍不存在的卡密在负缓存中保留 negative_ttl 秒。
+    
+    其他进程生成的卡密按主键水位增量读取：过滤器判定不存在时，若距上次同步超过
+    sync_interval 秒，先同步一次再下结论。每次同步按 load_chunk 分页读取已读最大主键之后的卡密，
+    每行只读一次；一页没有读完时本次按可能存在处理。并发事务可能不按主键顺序提交，读取时主键中的
+    空洞（以及构建时 settle_window 秒之前创建的最大主键之后的空洞）保留 settle_window 秒，
+    期间每次同步只重新读取这些空洞，补上晚提交的较小主键。
+    
+    包含非 ASCII 字符的卡密不按过滤器判定（排序规则下可能与已有卡密相等），直接查询数据库。
+    """
+    
+    def __init__(self, capacity=1000000, error_rate=0.001, sync_interval=1.0,
+                 negative_size=10000, negative_ttl=5, settle_window=30, load_chunk=10000):
+        self.enabled = True
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.settle_window = settle_window
+        self.load_chunk = load_chunk
+        self.negative = LRUTTLCache(max_size=negative_size, ttl=negative_ttl)
+        self._app = None
+        self._bloom = None
+        self._building = None
+        self._build_pid = None
+        self._retry_at = 0.0
+        self._max_read = 0
+        self._holes = deque()
+        self._caught_up = True
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.rejected = 0
+        self.syncs = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        if self._bloom is not None:
+            self._bloom._lock = threading.Lock()
+        if self._building is not None:
+            # 构建线程没有跟随 fork，丢弃未完成的过滤器
+            self._building = None
+            self._build_pid = None
+    
+    def init_app(self, app):
+        """从应用配置读取过滤器参数"""
+        self.enabled = app.config.get('CODE_FILTER_ENABLED', True)
+        self.capacity = app.config.get('CODE_FILTER_CAPACITY', 1000000)
+        self.error_rate = app.config.get('CODE_FILTER_ERROR_RATE', 0.001)
+        self.sync_interval = app.config.get('CODE_FILTER_SYNC_INTERVAL', 1.0)
+        self.negative.configure(
+            max_size=app.config.get('NEGATIVE_CACHE_SIZE', 10000),
+            ttl=app.config.get('NEGATIVE_CACHE_TTL', 5)
+        )
+        self._app = app
+    
+    @property
+    def ready(self):
+        return self._bloom is not None
+    
+    def _ensure_built(self):
+        """当前进程还没有构建过滤器时启动构建线程"""
+        if self._bloom is not None or self._build_pid == os.getpid():
+            return
+        with self._lock:
+            if self._build_pid == os.getpid() or time.monotonic() < self._retry_at:
+                return
+            self._start_build(self.capacity)
+    
+    def _start_build(self, capacity):
+        self._build_pid = os.getpid()
+        threading.Thread(target=self._build, args=(capacity,), name='code-filter-build', daemon=True).start()
+    
+    def _build(self, capacity):
+        started = time.monotonic()
+        settled_before = get_utc_time() - timedelta(seconds=self.settle_window)
+        try:
+            with self._app.app_context():
+                with db.engine.connect() as conn:
+                    total, max_id = conn.execute(db.select(db.func.count(Card.id), db.func.max(Card.id))).one()
+                    max_id = max_id or 0
+                    # 快照之前插入、之后才提交的卡密主键小于 max_id，此主键之后的空洞需要在 sync 中重新读取
+                    settled_id = conn.execute(
+                        db.select(Card.id)
+                        .where(Card.created_at < settled_before)
+                        .order_by(Card.id.desc())
+                        .limit(1)
+                    ).scalar() or 0
+                    bloom = BloomFilter(max(capacity, (total or 0) * 2), self.error_rate)
+                    # 构建期间生成的卡密同时写入新过滤器
+                    self._building = bloom
+                    result = conn.execution_options(stream_results=True, yield_per=self.load_chunk).execute(
+                        db.select(Card.id, Card.full_code).where(Card.id <= max_id).order_by(Card.id)
+                    )
+                    holes = deque()
+                    previous = min(settled_id, max_id)
+                    for card_id, full_code in result:
+                        bloom.add(code_key(full_code))
+                        if card_id > previous + 1:
+                            self._add_hole(holes, started, previous + 1, card_id - 1)
+                        previous = max(previous, card_id)
+                    if max_id > previous:
+                        self._add_hole(holes, started, previous + 1, max_id)
+        except Exception as e:
+            logger.error(f"构建卡密过滤器失败: {str(e)}")
+            with self._lock:
+                self._building = None
+                self._build_pid = None
+                self._retry_at = time.monotonic() + 30
+            return
+        
+        with self._lock:
+            self._bloom = bloom
+            self._building = None
+            self._max_read = max_id
+            self._holes = holes
+            self._caught_up = True
+            self._last_sync = 0.0
+        logger.info(f"卡密过滤器构建完成: {bloom.count} 个, 容量 {bloom.capacity}, "
+                    f"{len(bloom.bits) // 1024} KB, 耗时 {time.monotonic() - started:.2f} 秒")
+    
+    def add_many(self, full_codes):
+        """登记新生成或改名的卡密"""
+        full_codes = list(full_codes)
+        self.negative.invalidate_many(full_codes)
+        for bloom in (self._bloom, self._building):
+            if bloom is not None:
+                for full_code in full_codes:
+                    bloom.add(code_key(full_code))
+        bloom = self._bloom
+        if bloom is not None and bloom.count > bloom.capacity and self._building is None:
+            # 超出容量后误判率上升，按当前数量重新构建
+            with self._lock:
+                if self._building is None and self._build_pid is not None:
+                    logger.info(f"卡密过滤器超出容量 {bloom.capacity}，重新构建")
+                    self._start_build(bloom.count * 2)
+    
+    def add(self, full_code):
+        self.add_many([full_code])
+    
+    def remember_missing(self, full_code):
+        """记录查询后仍不存在的卡密
+        
+        按原样记录：在区分大小写的排序规则下，大小写不同的查询查不到并不代表真实卡密不存在。
+        """
+        if self.enabled:
+            self.negative.set(full_code, True)
+    
+    @staticmethod
+    def _add_hole(holes, seen_at, low, high, max_holes=256):
+        """记录主键空洞 [low, high]，超出数量时丢弃最早的空洞"""
+        holes.append((seen_at, low, high))
+        if len(holes) > max_holes:
+            holes.popleft()
+    
+    def sync(self):
+        """读取已读主键之后新插入的卡密与近期主键空洞中晚提交的卡密，返回读取数量"""
+        with self._sync_lock:
+            now = time.monotonic()
+            if now - self._last_sync < self.sync_interval:
+                return 0
+            self._last_sync = now
+            
+            holes = self._holes
+            while holes and now - holes[0][0] >= self.settle_window:
+                holes.popleft()
+            with db.engine.connect() as conn:
+                late = []
+                if holes:
+                    late = conn.execute(
+                        db.select(Card.id, Card.full_code)
+                        .where(db.or_(*(Card.id.between(low, high) for _, low, high in holes)))
+                    ).all()
+                rows = conn.execute(
+                    db.select(Card.id, Card.full_code)
+                    .where(Card.id > self._max_read)
+                    .order_by(Card.id)
+                    .limit(self.load_chunk)
+                ).all()
+            bloom = self._bloom
+            for row in late:
+                bloom.add(code_key(row.full_code))
+            previous = self._max_read
+            for row in rows:
+                bloom.add(code_key(row.full_code))
+                if row.id > previous + 1:
+                    self._add_hole(holes, now, previous + 1, row.id - 1)
+                previous = row.id
+            self._max_read = previous
+            # 一页读满时可能还有未读的卡密，下一次判定不受同步间隔限制
+            self._caught_up = len(rows) < self.load_chunk
+            if not self._caught_up:
+                self._last_sync = 0.0
+            self.syncs += 1
+            return len(late) + len(rows)
+    
+    def definitely_missing(self, full_code):
+        """卡密一定不存在时返回 True，不确定时返回 False（需查询数据库）"""
+        if not self.enabled:
+            return False
+        if not full_code.isascii():
+            return False
+        if self.negative.get(full_code) is not None:
+            UNKNOWN_CODE_REJECTIONS.labels('negative_cache').inc()
+            return True
+        
+        self._ensure_built()
+        bloom = self._bloom
+        if bloom is None:
+            return False
+        key = code_key(full_code)
+        if key in bloom:
+            return False
+        if time.monotonic() - self._last_sync >= self.sync_interval and self.sync() and key in bloom:
+            return False
+        if not self._caught_up:
+            # 新卡密还没有读完，不能断定不存在
+            return False
+        
+        self.rejected += 1
+        UNKNOWN_CODE_REJECTIONS.labels('bloom').inc()
+        return True
+    
+    def stats(self):
+        """过滤器与负缓存统计"""
+        bloom = self._bloom
+        return {
+            'enabled': self.enabled,
+            'ready': bloom is not None,
+            'building': self._building is not None,
+            'codes': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'memory_bytes': len(bloom.bits) if bloom else 0,
+            'hash_count': bloom.hash_count if bloom else 0,
+            'rejected': self.rejected,
+            'syncs': self.syncs,
+            'pending_holes': len(self._holes),
+            'negative_cache': self.negative.stats()
+        }
+
+# 全局卡密过滤器
+code_filter = CodeFilter()
@@ -0,0 +1,87 @@
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from contextlib import contextmanager
+from utils.card_cache import LRUTTLCache
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# 从库在 SQLALCHEMY_BINDS 中的键名前缀
+REPLICA_BIND_PREFIX = 'replica_'
+
+# 当前进程中最近写入过的卡密，复制延迟窗口内的读取仍走主库
+recent_writes = LRUTTLCache(max_size=10000, ttl=5)
+
+def init_replicas(app):
+    """读取 DATABASE_REPLICA_URLS（逗号分隔），注册为 SQLALCHEMY_BINDS 中的从库
+    
+    需在 db.init_app 之前调用。未配置从库时所有查询仍走 DATABASE_URL。
+    """
+    urls = [url.strip() for url in app.config.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    keys = []
+    for index, url in enumerate(urls):
+        key = f"{REPLICA_BIND_PREFIX}{index}"
+        binds[key] = url
+        keys.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config['REPLICA_BIND_KEYS'] = keys
+    
+    recent_writes.configure(ttl=app.config.get('REPLICA_READ_AFTER_WRITE', 5))
+    if keys:
+        logger.info(f"已配置从库: {len(keys)} 个")
+
+def replicas_enabled():
+    """当前应用是否配置了从库"""
+    return bool(current_app.config.get('REPLICA_BIND_KEYS'))
+
+class RoutingSession(Session):
+    """读写分离会话
+    
+    默认所有语句发往主库；在 replica_reads() 范围内，只读查询发往从库，
+    INSERT/UPDATE/DELETE 与 flush 始终发往主库。一个会话只使用一个从库，避免同一请求内读到不同的复制进度。
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing \
+                and not getattr(clause, 'is_dml', False):
+            engine = self._replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+    
+    def _replica_engine(self):
+        engine = self.info.get('replica_engine')
+        if engine is None:
+            keys = current_app.config.get('REPLICA_BIND_KEYS')
+            if not keys:
+                return None
+            engine = self._db.engines[random.choice(keys)]
+            self.info['replica_engine'] = engine
+        return engine
+
+@contextmanager
+def replica_reads(key=None):
+    """在此范围内的只读查询发往从库
+    
+    key 为卡密代码时，若该卡密刚在当前进程中被写入（见 recent_writes），仍从主库读取。
+    返回值表示是否使用从库，也可以作为视图函数的装饰器使用: @replica_reads()
+    """
+    if not replicas_enabled() or (key is not None and recent_writes.get(key) is not None):
+        yield False
+        return
+    
+    session = current_app.extensions['sqlalchemy'].session
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield True
+    finally:
+        session.info['use_replica'] = previous
+
+def mark_written(*keys):
+    """记录刚写入的卡密，复制延迟窗口内读取该卡密时走主库"""
+    for key in keys:
+        if key:
+            recent_writes.set(key, True)
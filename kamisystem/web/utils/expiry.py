@@ -0,0 +1,284 @@
+from models import db, Card, CardStatus, get_utc_time
+from utils.card_cache import card_cache
+from utils.stats import card_stats
+from utils.metrics import EXPIRY_SWEEP_DURATION, EXPIRED_CARDS
+import heapq
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def due_cards_statement(now, last_id=0, chunk_size=1000):
+    """按主键顺序读取下一块到期卡密的语句（idx_status_expire_at）"""
+    return (
+        db.select(Card.id, Card.full_code)
+        .where(Card.status == CardStatus.ACTIVE, Card.expire_at < now, Card.id > last_id)
+        .order_by(Card.id)
+        .limit(chunk_size)
+    )
+
+def scheduled_cards_statement(watermark=None, limit=5000):
+    """按 (expire_at, id) 顺序读取水位之后的激活卡密的语句（idx_status_expire_at）"""
+    query = db.select(Card.id, Card.full_code, Card.expire_at).where(
+        Card.status == CardStatus.ACTIVE, Card.expire_at.isnot(None)
+    )
+    if watermark is not None:
+        watermark_expire_at, watermark_id = watermark
+        query = query.where(db.or_(
+            Card.expire_at > watermark_expire_at,
+            db.and_(Card.expire_at == watermark_expire_at, Card.id > watermark_id)
+        ))
+    return query.order_by(Card.expire_at, Card.id).limit(limit)
+
+def overdue_statement(now):
+    """已到期但仍为激活状态的卡密数量与最早过期时间的语句（idx_status_expire_at）"""
+    return (
+        db.select(db.func.count(Card.id), db.func.min(Card.expire_at))
+        .where(Card.status == CardStatus.ACTIVE, Card.expire_at < now)
+    )
+
+def expire_due_cards(now=None, chunk_size=1000, collect_codes=False):
+    """将已到期的激活卡密批量标记为过期
+    
+    按主键顺序逐块取出到期卡密，每块只对该主键区间执行一条条件 UPDATE 并单独提交，
+    以限制 MySQL 上的锁持有时间。
+    返回 (更新数量, 过期卡密代码列表)，collect_codes 为 False 时列表为空。
+    """
+    now = now or get_utc_time()
+    due = (Card.status == CardStatus.ACTIVE, Card.expire_at < now)
+    started = time.perf_counter()
+    
+    updated_count = 0
+    expired_codes = []
+    last_id = 0
+    while True:
+        rows = db.session.execute(due_cards_statement(now, last_id, chunk_size)).all()
+        if not rows:
+            break
+        
+        first_id, last_id = rows[0].id, rows[-1].id
+        result = db.session.execute(
+            db.update(Card)
+            .where(*due, Card.id.between(first_id, last_id))
+            .values(status=CardStatus.EXPIRED, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        updated_count += result.rowcount
+        card_stats.record_expired(result.rowcount)
+        if collect_codes:
+            expired_codes.extend(row.full_code for row in rows)
+        
+        if len(rows) < chunk_size:
+            break
+    
+    EXPIRY_SWEEP_DURATION.labels('sweep').observe(time.perf_counter() - started)
+    EXPIRED_CARDS.labels('sweep').inc(updated_count)
+    return updated_count, expired_codes
+
+class ExpiryScheduler:
+    """按过期时间排序的卡密过期调度器
+    
+    最小堆保存尚未过期的激活卡密 (expire_at, id, full_code)。启动时沿 idx_status_expire_at 索引分批载入，
+    之后每隔 poll_interval 秒按 (expire_at, id) 水位读取新激活的卡密（多进程部署时激活发生在工作进程中），
+    同一进程内的激活也可以通过 schedule() 直接入堆。后台线程睡眠到堆顶卡密到期，
+    再把到期卡密按 batch_size 小批量标记为过期。
+    
+    管理员修改过期时间等不按时间顺序出现的卡密由整点的 expire_due_cards 兜底。
+    """
+    
+    def __init__(self, batch_size=200, poll_interval=5, load_chunk=5000):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.load_chunk = load_chunk
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._app = None
+        self._stopping = False
+        self._watermark = None
+        self._reset_metrics()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        """子进程没有调度线程，丢弃继承的堆和锁"""
+        self._cond = threading.Condition()
+        self._heap = []
+    
+    def _reset_metrics(self):
+        self._expired = 0
+        self._batches = 0
+        self._last_lag = None
+        self._max_lag = 0.0
+        self._total_lag = 0.0
+        self._lag_samples = 0
+        self._last_run_at = None
+    
+    def init_app(self, app):
+        """从应用配置读取调度参数"""
+        self.batch_size = app.config.get('EXPIRY_BATCH_SIZE', 200)
+        self.poll_interval = app.config.get('EXPIRY_POLL_INTERVAL', 5)
+    
+    @property
+    def running(self):
+        """调度线程是否在当前进程中运行（fork 出的子进程不继承线程）"""
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+    
+    def start(self, app):
+        """启动调度线程，每个部署只应在一个进程中启动"""
+        if self.running:
+            return
+        with self._cond:
+            self._heap = []
+            self._watermark = None
+            self._stopping = False
+        self._reset_metrics()
+        self._app = app
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='expiry-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"过期调度器已启动: 批量={self.batch_size}, 轮询间隔={self.poll_interval}秒")
+    
+    def stop(self, timeout=5):
+        """停止调度线程"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        self._thread = None
+    
+    def schedule(self, full_code, expire_at):
+        """登记新激活的卡密，调度器未在当前进程运行时忽略（由水位轮询读取）"""
+        if expire_at is None or not self.running:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (expire_at, 0, full_code))
+            if self._heap[0][2] == full_code:
+                self._cond.notify()
+    
+    def _load_new(self):
+        """沿 idx_status_expire_at 读取水位之后的激活卡密，返回读取数量"""
+        loaded = 0
+        while True:
+            rows = db.session.execute(scheduled_cards_statement(self._watermark, self.load_chunk)).all()
+            # 结束读事务，下次轮询才能看到其他进程新提交的激活
+            db.session.rollback()
+            
+            if rows:
+                with self._cond:
+                    for row in rows:
+                        heapq.heappush(self._heap, (row.expire_at, row.id, row.full_code))
+                self._watermark = (rows[-1].expire_at, rows[-1].id)
+                loaded += len(rows)
+            
+            if len(rows) < self.load_chunk:
+                return loaded
+    
+    def _expire_due(self):
+        """将一批已到期的卡密标记为过期，返回本批处理的卡密数量"""
+        now = get_utc_time()
+        with self._cond:
+            batch = []
+            while self._heap and self._heap[0][0] < now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap))
+        if not batch:
+            return 0
+        
+        codes = {full_code for _, _, full_code in batch}
+        started = time.perf_counter()
+        try:
+            # 条件中保留状态与过期时间，已被修改或已过期的卡密不会被重复更新
+            result = db.session.execute(
+                db.update(Card)
+                .where(Card.full_code.in_(codes), Card.status == CardStatus.ACTIVE, Card.expire_at < now)
+                .values(status=CardStatus.EXPIRED, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # 放回堆中，下一轮重试
+            with self._cond:
+                for entry in batch:
+                    heapq.heappush(self._heap, entry)
+            raise
+        
+        card_cache.invalidate_many(codes)
+        card_stats.record_expired(result.rowcount)
+        EXPIRY_SWEEP_DURATION.labels('scheduler').observe(time.perf_counter() - started)
+        EXPIRED_CARDS.labels('scheduler').inc(result.rowcount)
+        
+        lags = [(now - expire_at).total_seconds() for expire_at, _, _ in batch]
+        with self._cond:
+            self._expired += result.rowcount
+            self._batches += 1
+            self._last_lag = max(lags)
+            self._max_lag = max(self._max_lag, self._last_lag)
+            self._total_lag += sum(lags)
+            self._lag_samples += len(lags)
+            self._last_run_at = now
+        if result.rowcount:
+            logger.info(f"到期卡密已过期: {result.rowcount} 个, 最大延迟 {self._last_lag:.2f} 秒")
+        return len(batch)
+    
+    def _run(self):
+        next_poll = 0
+        while True:
+            try:
+                with self._app.app_context():
+                    if time.monotonic() >= next_poll:
+                        self._load_new()
+                        next_poll = time.monotonic() + self.poll_interval
+                    while self._expire_due():
+                        pass
+            except Exception as e:
+                logger.error(f"过期调度失败: {str(e)}")
+                next_poll = time.monotonic() + self.poll_interval
+            
+            with self._cond:
+                if self._stopping:
+                    return
+                timeout = next_poll - time.monotonic()
+                if self._heap:
+                    until_due = (self._heap[0][0] - get_utc_time()).total_seconds()
+                    timeout = min(timeout, until_due)
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+    
+    def stats(self):
+        """调度器运行指标，延迟为卡密实际被标记过期的时间与 expire_at 之差（秒）"""
+        with self._cond:
+            next_expire_at = self._heap[0][0] if self._heap else None
+            return {
+                'running': self.running,
+                'scheduled': len(self._heap),
+                'next_expire_at': next_expire_at.isoformat() if next_expire_at else None,
+                'expired': self._expired,
+                'batches': self._batches,
+                'last_lag_seconds': round(self._last_lag, 3) if self._last_lag is not None else None,
+                'max_lag_seconds': round(self._max_lag, 3),
+                'avg_lag_seconds': round(self._total_lag / self._lag_samples, 3) if self._lag_samples else None,
+                'last_run_at': self._last_run_at.isoformat() if self._last_run_at else None
+            }
+
+def overdue_stats(now=None):
+    """数据库中已到期但仍为激活状态的卡密数量及最长逾期秒数，任何进程都可以查询"""
+    now = now or get_utc_time()
+    count, oldest = db.session.execute(overdue_statement(now)).one()
+    return {
+        'overdue': count,
+        'max_overdue_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0
+    }
+
+# 全局过期调度器
+expiry_scheduler = ExpiryScheduler()
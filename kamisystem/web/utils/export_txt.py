@@ -1,138 +1,243 @@
-from models import db, Card, CardStatus, SHANGHAI_TZ
-from datetime import datetime
-import os
-import logging
-import pytz
-
-logger = logging.getLogger(__name__)
-
-def export_unused_cards(prefix_filter=''):
-    """导出未使用卡密为TXT文件"""
-    try:
-        # 构建查询
-        query = Card.query.filter(Card.status == CardStatus.UNUSED)
-        
-        if prefix_filter:
-            query = query.filter(Card.prefix == prefix_filter)
-        
-        # 按创建时间排序
-        cards = query.order_by(Card.created_at.desc()).all()
-        
-        if not cards:
-            return None
-        
-        # 生成文件名
-        current_time = datetime.now(SHANGHAI_TZ)
-        timestamp = current_time.strftime('%Y%m%d_%H%M%S')
-        if prefix_filter:
-            filename = f"unused_cards_{prefix_filter}_{timestamp}.txt"
-        else:
-            filename = f"unused_cards_{timestamp}.txt"
-        
-        # 确保导出目录存在
-        export_dir = 'exports'
-        if not os.path.exists(export_dir):
-            os.makedirs(export_dir)
-        
-        filepath = os.path.join(export_dir, filename)
-        
-        # 写入文件
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"# 未使用卡密导出\n")
-            f.write(f"# 导出时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')} (上海时区)\n")
-            if prefix_filter:
-                f.write(f"# 前缀筛选: {prefix_filter}\n")
-            f.write(f"# 总计: {len(cards)} 个\n")
-            f.write(f"# 格式: 卡密代码\n")
-            f.write("# " + "="*50 + "\n\n")
-            
-            for card in cards:
-                f.write(f"{card.full_code}\n")
-        
-        logger.info(f"导出未使用卡密: {filepath}, 数量: {len(cards)}")
-        return filepath
-        
-    except Exception as e:
-        logger.error(f"导出卡密时发生错误: {str(e)}")
-        return None
-
-def generate_cards_batch(prefix, count, code_length=10):
-    """批量生成卡密"""
-    try:
-        success_count = 0
-        failed_count = 0
-        
-        for i in range(count):
-            try:
-                card = Card.create_card(prefix, code_length)
-                db.session.add(card)
-                success_count += 1
-                
-                # 每100个提交一次
-                if success_count % 100 == 0:
-                    db.session.commit()
-                    logger.info(f"已生成 {success_count}/{count} 个卡密")
-                    
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"生成卡密失败: {str(e)}")
-                
-                # 如果失败太多，停止生成
-                if failed_count > 10:
-                    logger.error("生成失败次数过多，停止生成")
-                    break
-        
-        # 最终提交
-        if success_count > 0:
-            db.session.commit()
-            logger.info(f"批量生成完成: 成功={success_count}, 失败={failed_count}")
-        
-        return success_count
-        
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"批量生成卡密时发生错误: {str(e)}")
-        return 0
-
-def clean_expired_cards():
-    """清理过期卡密状态"""
-    try:
-        # 查找所有活跃状态的卡密
-        active_cards = Card.query.filter(Card.status == CardStatus.ACTIVE).all()
-        
-        updated_count = 0
-        for card in active_cards:
-            if card.check_and_update_status():
-                updated_count += 1
-        
-        if updated_count > 0:
-            db.session.commit()
-            logger.info(f"清理过期卡密: {updated_count} 个")
-        
-        return updated_count
-        
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"清理过期卡密时发生错误: {str(e)}")
-        return 0
-
-def get_statistics():
-    """获取系统统计信息"""
-    try:
-        stats = {
-            'total': Card.query.count(),
-            'unused': Card.query.filter(Card.status == CardStatus.UNUSED).count(),
-            'active': Card.query.filter(Card.status == CardStatus.ACTIVE).count(),
-            'expired': Card.query.filter(Card.status == CardStatus.EXPIRED).count(),
-            'prefixes': db.session.query(Card.prefix).distinct().count()
-        }
-        return stats
-    except Exception as e:
-        logger.error(f"获取统计信息时发生错误: {str(e)}")
-        return {
-            'total': 0,
-            'unused': 0,
-            'active': 0,
-            'expired': 0,
-            'prefixes': 0
-        }
+from models import db, Card, CardStatus, SHANGHAI_TZ, get_utc_time
+from utils.card_cache import card_cache
+from utils.expiry import expire_due_cards
+from utils.stats import card_stats
+from utils.search import index_codes
+from utils.db_routing import replica_reads
+from utils.code_filter import code_filter
+from utils.metrics import EXPORT_BYTES, EXPORTED_CARDS, GENERATE_DURATION, GENERATED_CARDS
+from datetime import datetime
+from itertools import chain
+import os
+import logging
+import pytz
+import time
+import zlib
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'exports'
+
+def _unused_cards_filter(stmt, prefix_filter=''):
+    """为查询添加未使用卡密及前缀筛选条件"""
+    stmt = stmt.where(Card.status == CardStatus.UNUSED)
+    if prefix_filter:
+        stmt = stmt.where(Card.prefix == prefix_filter)
+    return stmt
+
+def unused_count_statement(prefix_filter=''):
+    """统计未使用卡密数量的语句"""
+    return _unused_cards_filter(db.select(db.func.count(Card.id)), prefix_filter)
+
+def unused_codes_statement(prefix_filter=''):
+    """读取未使用卡密代码的语句，按生成时间倒序（idx_status_prefix_created_at 覆盖）"""
+    return _unused_cards_filter(db.select(Card.full_code), prefix_filter).order_by(Card.created_at.desc())
+
+def count_unused_cards(prefix_filter=''):
+    """统计未使用卡密数量（配置从库时读取从库）"""
+    with replica_reads():
+        return db.session.scalar(unused_count_statement(prefix_filter))
+
+def iter_unused_codes(prefix_filter='', chunk_size=1000):
+    """以服务端游标分批读取未使用卡密代码，每次产出一批 full_code 列表（配置从库时读取从库）"""
+    stmt = unused_codes_statement(prefix_filter).execution_options(yield_per=chunk_size)
+    with replica_reads():
+        yield from db.session.execute(stmt).scalars().partitions()
+
+def export_filename(prefix_filter='', current_time=None):
+    """生成导出文件名"""
+    current_time = current_time or datetime.now(SHANGHAI_TZ)
+    timestamp = current_time.strftime('%Y%m%d_%H%M%S')
+    if prefix_filter:
+        return f"unused_cards_{prefix_filter}_{timestamp}.txt"
+    return f"unused_cards_{timestamp}.txt"
+
+def _export_header(prefix_filter, total, current_time):
+    """生成导出文件头"""
+    lines = [
+        "# 未使用卡密导出",
+        f"# 导出时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')} (上海时区)"
+    ]
+    if prefix_filter:
+        lines.append(f"# 前缀筛选: {prefix_filter}")
+    lines.append(f"# 总计: {total} 个")
+    lines.append("# 格式: 卡密代码")
+    lines.append("# " + "="*50)
+    return "\n".join(lines) + "\n\n"
+
+def stream_unused_cards(prefix_filter='', total=None, compress=False, archive_path=None, current_time=None):
+    """流式生成未使用卡密导出内容
+    
+    逐批读取卡密并立即产出字节块，compress 为 True 时边生成边 gzip 压缩；
+    只有指定 archive_path 时才会同时写入一份未压缩的归档文件。
+    """
+    current_time = current_time or datetime.now(SHANGHAI_TZ)
+    if total is None:
+        total = count_unused_cards(prefix_filter)
+    
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    archive = open(archive_path, 'w', encoding='utf-8') if archive_path else None
+    size = 0
+    try:
+        texts = chain(
+            [_export_header(prefix_filter, total, current_time)],
+            ("\n".join(codes) + "\n" for codes in iter_unused_codes(prefix_filter))
+        )
+        for text in texts:
+            if archive:
+                archive.write(text)
+            data = text.encode('utf-8')
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                size += len(data)
+                yield data
+        
+        if compressor:
+            data = compressor.flush()
+            size += len(data)
+            yield data
+        
+        EXPORT_BYTES.labels(str(compress).lower()).observe(size)
+        EXPORTED_CARDS.labels(str(compress).lower()).inc(total)
+        logger.info(f"流式导出未使用卡密: 数量: {total}" + (f", 归档: {archive_path}" if archive_path else ""))
+    
+    except Exception as e:
+        logger.error(f"流式导出卡密时发生错误: {str(e)}")
+        raise
+    
+    finally:
+        if archive:
+            archive.close()
+
+def export_unused_cards(prefix_filter=''):
+    """导出未使用卡密为TXT文件"""
+    try:
+        total = count_unused_cards(prefix_filter)
+        
+        if not total:
+            return None
+        
+        # 确保导出目录存在
+        if not os.path.exists(EXPORT_DIR):
+            os.makedirs(EXPORT_DIR)
+        
+        current_time = datetime.now(SHANGHAI_TZ)
+        filepath = os.path.join(EXPORT_DIR, export_filename(prefix_filter, current_time))
+        
+        # 写入文件
+        for _ in stream_unused_cards(prefix_filter, total, archive_path=filepath, current_time=current_time):
+            pass
+        
+        logger.info(f"导出未使用卡密: {filepath}, 数量: {total}")
+        return filepath
+        
+    except Exception as e:
+        logger.error(f"导出卡密时发生错误: {str(e)}")
+        return None
+
+def _new_card_rows(prefix, count, code_length):
+    """生成一批不与数据库重复的卡密行数据"""
+    now = get_utc_time()
+    rows = {}
+    candidates = set()
+    for _ in range(100):
+        while len(rows) + len(candidates) < count:
+            full_code = f"{prefix}-{Card.generate_random_code(code_length)}"
+            if full_code not in rows:
+                candidates.add(full_code)
+        
+        # 一次 IN 查询剔除已存在的代码，只为撞车的部分重新生成
+        existing = set(db.session.scalars(
+            db.select(Card.full_code).where(Card.full_code.in_(candidates))
+        ))
+        for full_code in candidates - existing:
+            rows[full_code] = {
+                'prefix': prefix,
+                'code': full_code[len(prefix) + 1:],
+                'full_code': full_code,
+                'status': CardStatus.UNUSED,
+                'created_at': now,
+                'updated_at': now
+            }
+        candidates.clear()
+        if len(rows) >= count:
+            return list(rows.values())
+    
+    raise Exception("无法生成唯一的卡密代码")
+
+def generate_cards_batch(prefix, count, code_length=10, batch_size=1000):
+    """批量生成卡密
+    
+    每批候选代码只做一次唯一性查询，并以 executemany 批量插入；
+    与并发生成撞上唯一索引时回滚该批后重新生成。
+    """
+    try:
+        started = time.perf_counter()
+        success_count = 0
+        failed_count = 0
+        
+        while success_count < count:
+            rows = _new_card_rows(prefix, min(batch_size, count - success_count), code_length)
+            try:
+                db.session.execute(db.insert(Card), rows)
+                index_codes([row['full_code'] for row in rows])
+                db.session.commit()
+                code_filter.add_many(row['full_code'] for row in rows)
+            except IntegrityError as e:
+                db.session.rollback()
+                failed_count += 1
+                logger.warning(f"批量插入卡密冲突，重新生成本批: {str(e)}")
+                
+                # 如果失败太多，停止生成
+                if failed_count > 10:
+                    logger.error("生成失败次数过多，停止生成")
+                    break
+                continue
+            
+            success_count += len(rows)
+            card_stats.record_generated(prefix, len(rows))
+            logger.info(f"已生成 {success_count}/{count} 个卡密")
+        
+        GENERATE_DURATION.observe(time.perf_counter() - started)
+        GENERATED_CARDS.inc(success_count)
+        if success_count > 0:
+            logger.info(f"批量生成完成: 成功={success_count}, 失败批次={failed_count}")
+        
+        return success_count
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"批量生成卡密时发生错误: {str(e)}")
+        return 0
+
+def clean_expired_cards():
+    """清理过期卡密状态"""
+    try:
+        updated_count, expired_codes = expire_due_cards(collect_codes=True)
+        
+        if updated_count > 0:
+            card_cache.invalidate_many(expired_codes)
+            logger.info(f"清理过期卡密: {updated_count} 个")
+        
+        return updated_count
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"清理过期卡密时发生错误: {str(e)}")
+        return 0
+
+def get_statistics():
+    """获取系统统计信息"""
+    try:
+        return card_stats.get_stats()
+    except Exception as e:
+        logger.error(f"获取统计信息时发生错误: {str(e)}")
+        return {
+            'total': 0,
+            'unused': 0,
+            'active': 0,
+            'expired': 0,
+            'prefixes': 0
+        }
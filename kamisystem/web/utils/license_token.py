@@ -0,0 +1,123 @@
+from utils.card_cache import LRUTTLCache
+from datetime import datetime
+import base64
+import calendar
+import json
+import logging
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives import serialization
+except ImportError:
+    Ed25519PrivateKey = None
+
+logger = logging.getLogger(__name__)
+
+# 离线授权令牌: v1.<密钥ID>.<载荷>.<签名>，载荷与签名为 base64url（无填充）
+# 载荷为 JSON: c 卡密, m 机器码, e 卡密过期时间, i 签发时间, x 令牌有效期（均为 UTC 秒级时间戳）
+# 签名为 Ed25519，签名内容是 "v1.<密钥ID>.<载荷>"，客户端只需持有公钥即可校验
+TOKEN_VERSION = 'v1'
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def timestamp(dt):
+    """不带时区的 UTC 时间转换为秒级时间戳"""
+    return calendar.timegm(dt.utctimetuple())
+
+def generate_key():
+    """生成一个签名私钥，返回 (私钥, 公钥)，均为 base64url 字符串"""
+    if Ed25519PrivateKey is None:
+        raise ImportError("签发离线授权令牌需要安装 cryptography 包")
+    private_key = Ed25519PrivateKey.generate()
+    private = private_key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                        serialization.NoEncryption())
+    return b64encode(private), _public_key_text(private_key)
+
+def _public_key_text(private_key):
+    return b64encode(private_key.public_key().public_bytes(serialization.Encoding.Raw,
+                                                           serialization.PublicFormat.Raw))
+
+class LicenseSigner:
+    """签发离线授权令牌
+    
+    LICENSE_SIGNING_KEYS 为逗号分隔的 <密钥ID>:<私钥>，LICENSE_SIGNING_KEY_ID 指定用于签发的密钥
+    （默认最后一个）。轮换密钥时先加入新密钥并让客户端获得新公钥（见 public_keys），
+    再切换 LICENSE_SIGNING_KEY_ID，旧令牌全部过期后移除旧密钥。
+    
+    令牌有效期不超过卡密的过期时间与 ttl 中较早者，管理员修改或删除卡密后，
+    已签发的令牌最多在 ttl 内仍可离线使用。同一卡密与机器码的令牌在有效期的前一半内复用，不重复签名。
+    """
+    
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.keys = {}
+        self.active_kid = None
+        self._issued = LRUTTLCache(max_size=10000, ttl=ttl / 2)
+    
+    @property
+    def enabled(self):
+        return self.active_kid is not None
+    
+    def init_app(self, app):
+        """从应用配置读取签名密钥"""
+        self.configure(app.config.get('LICENSE_SIGNING_KEYS', ''),
+                       app.config.get('LICENSE_SIGNING_KEY_ID', ''),
+                       app.config.get('LICENSE_TOKEN_TTL', 3600))
+    
+    def configure(self, keys_text, active_kid='', ttl=3600):
+        """解析密钥配置，未配置密钥时不签发令牌"""
+        self.keys = {}
+        self.active_kid = None
+        self.ttl = ttl
+        self._issued.configure(ttl=ttl / 2)
+        
+        entries = [entry.strip() for entry in (keys_text or '').split(',') if entry.strip()]
+        if not entries:
+            return
+        if Ed25519PrivateKey is None:
+            logger.error("已配置 LICENSE_SIGNING_KEYS 但未安装 cryptography，不签发离线授权令牌")
+            return
+        
+        for entry in entries:
+            kid, _, private = entry.partition(':')
+            self.keys[kid.strip()] = Ed25519PrivateKey.from_private_bytes(b64decode(private.strip()))
+        self.active_kid = active_kid or list(self.keys)[-1]
+        if self.active_kid not in self.keys:
+            raise ValueError(f"LICENSE_SIGNING_KEY_ID={self.active_kid} 不在 LICENSE_SIGNING_KEYS 中")
+        logger.info(f"离线授权令牌已启用: 签名密钥 {self.active_kid}, 共 {len(self.keys)} 个密钥")
+    
+    def public_keys(self):
+        """全部密钥的公钥 {密钥ID: 公钥}，包括轮换期间仍在使用的旧密钥"""
+        return {kid: _public_key_text(key) for kid, key in self.keys.items()}
+    
+    def issue(self, full_code, machine_code, expire_at, now=None):
+        """为已激活的卡密签发令牌，未启用时返回 None"""
+        if not self.enabled:
+            return None
+        cache_key = (full_code, machine_code, expire_at)
+        token = self._issued.get(cache_key)
+        if token is not None and now is None:
+            return token
+        
+        now = now or datetime.utcnow()
+        issued_at = timestamp(now)
+        expire_ts = timestamp(expire_at)
+        claims = {
+            'c': full_code,
+            'm': machine_code,
+            'e': expire_ts,
+            'i': issued_at,
+            'x': min(expire_ts, issued_at + int(self.ttl))
+        }
+        body = f"{TOKEN_VERSION}.{self.active_kid}." + b64encode(
+            json.dumps(claims, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+        token = body + '.' + b64encode(self.keys[self.active_kid].sign(body.encode('ascii')))
+        self._issued.set(cache_key, token)
+        return token
+
+# 全局令牌签发器
+license_signer = LicenseSigner()
@@ -0,0 +1,62 @@
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
+import os
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class _AsyncLogging:
+    """非阻塞日志：请求线程只把日志记录放入队列，由后台线程写入输出流"""
+    
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self._targets = []
+    
+    def configure(self, level=logging.INFO, stream=None):
+        """配置根日志记录器，重复调用只调整级别"""
+        root = logging.getLogger()
+        root.setLevel(level)
+        if self.handler is not None:
+            return
+        
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(logging.Formatter(LOG_FORMAT))
+        self._targets = [target]
+        
+        self.handler = QueueHandler(queue.SimpleQueue())
+        root.addHandler(self.handler)
+        self._start()
+        
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # gunicorn 在主进程中导入应用后 fork 工作进程，子进程中没有写日志的后台线程
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _start(self):
+        self.listener = QueueListener(self.handler.queue, *self._targets, respect_handler_level=True)
+        self.listener.start()
+    
+    def _after_fork(self):
+        if self.handler is None:
+            return
+        self.handler.queue = queue.SimpleQueue()
+        self._start()
+    
+    def stop(self):
+        """写完队列中剩余的日志后停止后台线程"""
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+
+_async_logging = _AsyncLogging()
+
+def setup_logging(level=None):
+    """配置全局日志，代替各模块中的 logging.basicConfig
+    
+    日志级别默认读取 LOG_LEVEL 环境变量（默认 INFO）。
+    """
+    level = level or os.environ.get('LOG_LEVEL', 'INFO').upper()
+    _async_logging.configure(level)
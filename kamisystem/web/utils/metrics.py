@@ -0,0 +1,423 @@
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prometheus 文本格式（0.0.4）的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    """带标签的指标，子指标按标签值缓存，记录时只持有子指标自己的锁"""
+    
+    type = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabeled = self.labels()
+    
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+    
+    def samples(self):
+        """返回 {标签值: 样本数据}，样本数据可被 JSON 序列化并在多进程间相加"""
+        return {values: child.value() for values, child in list(self._children.items())}
+    
+    def _reset(self):
+        self._lock = threading.Lock()
+        for child in self._children.values():
+            if child is not None:
+                child.__init__(*child._args)
+
+class _CounterChild:
+    _args = ()
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+    
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+    
+    def value(self):
+        return self._value
+
+class Counter(_Metric):
+    """单调递增计数"""
+    
+    type = 'counter'
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount=1):
+        self._unlabeled.inc(amount)
+    
+    def render(self, samples):
+        for values, value in samples.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._args = (buckets,)
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        # 各分桶的非累计计数，最后一格对应 +Inf
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+    
+    def observe(self, value):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+    
+    def value(self):
+        with self._lock:
+            return self._counts + [self._sum]
+
+class Histogram(_Metric):
+    """固定分桶的直方图，输出时再累加为 Prometheus 的累计分桶"""
+    
+    type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value):
+        self._unlabeled.observe(value)
+    
+    def render(self, samples):
+        for values, sample in samples.items():
+            counts, total = sample[:-1], sample[-1]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class GaugeCallback(_Metric):
+    """抓取时才计算的瞬时值，func 返回 {标签值元组: 数值}"""
+    
+    type = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        self.func = func
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return None
+    
+    def samples(self):
+        try:
+            return {tuple(str(v) for v in values): value for values, value in self.func().items()}
+        except Exception as e:
+            logger.warning(f"计算指标 {self.name} 失败: {str(e)}")
+            return {}
+    
+    def render(self, samples):
+        for values, value in samples.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+def _merge(total, sample):
+    if isinstance(sample, list):
+        return [a + b for a, b in zip(total, sample)] if total is not None else list(sample)
+    return (total or 0) + sample
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+class Metrics:
+    """进程内指标注册表，以 Prometheus 文本格式输出
+    
+    记录一次观测只是一次分桶查找加一次无竞争的加锁，不产生 I/O。
+    gunicorn 多进程部署时，每个进程的指标相互独立；配置 METRICS_DIR 后各进程
+    每隔 flush_interval 秒把自己的快照写入该目录，/metrics 汇总目录中全部进程的数据
+    （计数与直方图累加，瞬时值只累加仍存活进程的数据）。
+    """
+    
+    def __init__(self, directory='', flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._flusher = None
+        self._flusher_pid = None
+        self._stop = threading.Event()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        # 子进程从零开始计数，否则汇总时会把 fork 前主进程的数据重复计算
+        for metric in self._metrics:
+            metric._reset()
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        """读取 METRICS_DIR / METRICS_FLUSH_INTERVAL，配置了目录时启动快照线程"""
+        self.directory = app.config.get('METRICS_DIR', '')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._start_flusher()
+    
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def gauge_callback(self, name, documentation, labelnames=(), func=None):
+        return self._register(GaugeCallback(name, documentation, labelnames, func))
+    
+    def snapshot(self):
+        """当前进程全部指标的样本 {指标名: {标签值元组: 样本}}"""
+        return {metric.name: metric.samples() for metric in self._metrics}
+    
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+    
+    def flush(self):
+        """把当前进程的快照写入 METRICS_DIR（先写临时文件再改名，读取方不会读到半个文件）"""
+        if not self.directory:
+            return
+        pid = os.getpid()
+        data = {name: [[list(values), sample] for values, sample in samples.items()]
+                for name, samples in self.snapshot().items()}
+        path = self._snapshot_path(pid)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'pid': pid, 'metrics': data}, f)
+        os.replace(path + '.tmp', path)
+    
+    def _start_flusher(self):
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        self._flusher_pid = os.getpid()
+        self._flusher.start()
+        owner_pid = self._flusher_pid
+        atexit.register(lambda: os.getpid() == owner_pid and self._stop_flusher())
+    
+    def _flush_loop(self):
+        stop = self._stop
+        while not stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"写入指标快照失败: {str(e)}")
+    
+    def _stop_flusher(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception:
+            pass
+    
+    def clear_directory(self, directory=None):
+        """删除 METRICS_DIR 中上一次运行留下的快照，由 gunicorn 主进程在创建工作进程前调用"""
+        directory = directory or self.directory
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json*')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _collect(self):
+        if not self.directory:
+            return self.snapshot()
+        
+        own_pid = os.getpid()
+        snapshots = [(own_pid, self.snapshot())]
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data['pid'] == own_pid:
+                continue
+            snapshots.append((data['pid'], {
+                name: {tuple(values): sample for values, sample in samples}
+                for name, samples in data['metrics'].items()
+            }))
+        
+        gauges = {metric.name for metric in self._metrics if metric.type == 'gauge'}
+        merged = {}
+        for pid, snapshot in snapshots:
+            alive = pid == own_pid or _pid_alive(pid)
+            for name, samples in snapshot.items():
+                if name in gauges and not alive:
+                    continue
+                target = merged.setdefault(name, {})
+                for values, sample in samples.items():
+                    target[values] = _merge(target.get(values), sample)
+        return merged
+    
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        collected = self._collect()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(collected.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+# 全局指标注册表
+metrics = Metrics()
+
+VALIDATE_LATENCY = metrics.histogram(
+    'kami_validate_duration_seconds', '/api/validate 请求耗时，按验证结果分类', ('outcome',))
+DB_QUERY_DURATION = metrics.histogram(
+    'kami_db_query_duration_seconds', '数据库语句执行耗时，按接口（视图函数）分类', ('endpoint',))
+POOL_WAIT = metrics.histogram(
+    'kami_db_pool_wait_seconds', '从连接池取得连接的等待时间', ('pool',))
+POOL_TIMEOUTS = metrics.counter(
+    'kami_db_pool_timeouts_total', '等待连接超时（DB_POOL_TIMEOUT）的次数', ('pool',))
+# 连接池占用情况在抓取时读取，见 instrument_engines
+POOL_CHECKED_OUT = metrics.gauge_callback(
+    'kami_db_pool_checked_out', '当前被占用的连接数，除以 kami_db_pool_capacity 即连接池饱和度', ('pool',),
+    func=dict)
+POOL_CAPACITY = metrics.gauge_callback(
+    'kami_db_pool_capacity', '连接池容量（pool_size + max_overflow）', ('pool',), func=dict)
+EXPIRY_SWEEP_DURATION = metrics.histogram(
+    'kami_expiry_sweep_duration_seconds', '一次过期处理的耗时，scheduler 为调度器单批，sweep 为全表兜底清理',
+    ('source',), buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60))
+EXPIRED_CARDS = metrics.counter(
+    'kami_expired_cards_total', '被标记为过期的卡密数量', ('source',))
+GENERATE_DURATION = metrics.histogram(
+    'kami_generate_duration_seconds', '一次批量生成卡密的耗时',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60))
+GENERATED_CARDS = metrics.counter(
+    'kami_generated_cards_total', '批量生成的卡密数量，除以 kami_generate_duration_seconds_sum 即生成吞吐')
+EXPORT_BYTES = metrics.histogram(
+    'kami_export_bytes', '一次导出的响应大小（字节）', ('compressed',),
+    buckets=tuple(1024 * 4 ** i for i in range(11)))
+EXPORTED_CARDS = metrics.counter(
+    'kami_exported_cards_total', '导出的卡密数量', ('compressed',))
+
+class TimedQueuePool(QueuePool):
+    """记录取连接等待时间的 QueuePool，metrics_name 为指标中的 pool 标签"""
+    
+    metrics_name = 'primary'
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            POOL_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+    
+    def recreate(self):
+        # engine.dispose() 会按原参数新建连接池，保留标签名
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+def engine_pool_options(database_url):
+    """连接池使用 TimedQueuePool；SQLite 内存数据库沿用 SQLAlchemy 默认的连接池"""
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {'poolclass': TimedQueuePool}
+
+def _query_endpoint():
+    from flask import has_request_context, request
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    DB_QUERY_DURATION.labels(_query_endpoint()).observe(time.perf_counter() - started)
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+def instrument_engines(app, db):
+    """为应用的所有数据库引擎（主库与从库）登记语句计时，连接池以 bind 键命名"""
+    with app.app_context():
+        engines = db.engines
+    for key, engine in engines.items():
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.metrics_name = key or 'primary'
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    
+    def pool_usage(field):
+        def collect():
+            result = {}
+            for key, engine in engines.items():
+                pool = engine.pool
+                if isinstance(pool, QueuePool):
+                    name = key or 'primary'
+                    result[(name,)] = pool.checkedout() if field == 'checked_out' \
+                        else pool.size() + max(pool._max_overflow, 0)
+            return result
+        return collect
+    
+    POOL_CHECKED_OUT.func = pool_usage('checked_out')
+    POOL_CAPACITY.func = pool_usage('capacity')
@@ -0,0 +1,82 @@
+from models import db, Card, SchemaMigration
+from sqlalchemy.schema import CreateIndex
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 数据库迁移
+#
+# db.create_all() 只创建缺少的表，已存在的表不会增加新声明的索引或列，因此表结构的变更都写成迁移：
+# 每个迁移是 (版本, 说明, 函数)，按版本顺序执行，执行过的版本记录在 schema_migrations 表中。
+# 迁移函数接收数据库连接，应可重复执行（先检查再修改），新建的数据库由 create_all 建好表后
+# 执行全部迁移也不会出错。MySQL 的 DDL 会隐式提交，迁移中途失败时已执行的语句不会回滚，
+# 修复后重新执行即可。
+
+def existing_indexes(conn, table_name):
+    """表中已有的索引名称"""
+    return {index['name'] for index in db.inspect(conn).get_indexes(table_name)}
+
+def model_index(table, name):
+    """模型中声明的索引"""
+    for index in table.indexes:
+        if index.name == name:
+            return index
+    raise KeyError(f"{table.name} 中没有声明索引 {name}")
+
+def create_index(conn, table, name):
+    """按模型声明创建索引，已存在时跳过；MySQL 使用在线 DDL，建索引期间不阻塞读写"""
+    if name in existing_indexes(conn, table.name):
+        return False
+    ddl = str(CreateIndex(model_index(table, name)).compile(dialect=conn.dialect))
+    if conn.dialect.name == 'mysql':
+        ddl += ' ALGORITHM=INPLACE LOCK=NONE'
+    conn.exec_driver_sql(ddl)
+    logger.info(f"已创建索引 {table.name}.{name}")
+    return True
+
+def drop_index(conn, table, name):
+    """删除索引，不存在时跳过"""
+    if name not in existing_indexes(conn, table.name):
+        return False
+    if conn.dialect.name == 'mysql':
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} DROP INDEX {name}")
+    else:
+        conn.exec_driver_sql(f"DROP INDEX {name}")
+    logger.info(f"已删除索引 {table.name}.{name}")
+    return True
+
+def _query_indexes(conn):
+    table = Card.__table__
+    for name in ('idx_status', 'idx_prefix', 'idx_machine_code', 'idx_status_prefix_id',
+                 'idx_status_prefix_created_at', 'idx_status_expire_at'):
+        create_index(conn, table, name)
+    # idx_expire_at 由 (status, expire_at) 代替；idx_full_code 与 full_code 的唯一索引重复
+    for name in ('idx_expire_at', 'idx_full_code'):
+        drop_index(conn, table, name)
+
+MIGRATIONS = [
+    ('0001', '按查询模式建立复合索引，删除重复的单列索引', _query_indexes),
+]
+
+def migration_status():
+    """全部迁移及执行时间，未执行的为 None"""
+    applied = {row.version: row.applied_at for row in SchemaMigration.query.all()}
+    return [(version, description, applied.get(version)) for version, description, _ in MIGRATIONS]
+
+def upgrade():
+    """创建缺少的表并执行尚未执行的迁移，返回本次执行的版本列表"""
+    db.create_all()
+    applied = set(db.session.scalars(db.select(SchemaMigration.version)))
+    db.session.rollback()
+    
+    executed = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"执行数据库迁移 {version}: {description}")
+        with db.engine.begin() as conn:
+            migrate(conn)
+        db.session.add(SchemaMigration(version=version, description=description))
+        db.session.commit()
+        executed.append(version)
+    return executed
@@ -0,0 +1,49 @@
+from models import Card
+
+class KeysetPage:
+    """基于主键游标的分页结果，属性与模板中使用的分页对象保持一致"""
+    
+    keyset = True
+    
+    def __init__(self, items, per_page, has_prev, has_next, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.total = total
+    
+    @property
+    def prev_cursor(self):
+        """上一页游标，作为 before_id 参数"""
+        return self.items[0].id if self.items else None
+    
+    @property
+    def next_cursor(self):
+        """下一页游标，作为 after_id 参数"""
+        return self.items[-1].id if self.items else None
+
+def next_page_query(query, per_page, after_id=None):
+    """after_id 之后一页（多取一条用于判断是否有下一页）的查询"""
+    if after_id is not None:
+        query = query.filter(Card.id > after_id)
+    return query.order_by(Card.id).limit(per_page + 1)
+
+def keyset_paginate(query, per_page, after_id=None, before_id=None, total=None):
+    """按主键游标分页
+    
+    用 id > after_id 或 id < before_id 的条件定位，不使用 OFFSET 也不统计总数，
+    任意深度的页面代价都与第一页相同。total 由调用方提供近似值。
+    """
+    if before_id is not None:
+        rows = query.filter(Card.id < before_id).order_by(Card.id.desc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = bool(items) and query.filter(Card.id > items[-1].id).with_entities(Card.id).first() is not None
+    else:
+        rows = next_page_query(query, per_page, after_id).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after_id is not None and bool(items) and \
+            query.filter(Card.id < items[0].id).with_entities(Card.id).first() is not None
+    
+    return KeysetPage(items, per_page, has_prev, has_next, total)
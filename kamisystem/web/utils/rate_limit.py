@@ -0,0 +1,186 @@
+from utils.metrics import metrics
+import logging
+import math
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = metrics.counter(
+    'kami_rate_limited_total', '被限流拒绝的请求数量，scope 为 ip 或 machine', ('scope',))
+
+class MemoryTokenBuckets:
+    """进程内令牌桶表
+    
+    每个键只保存 [剩余令牌, 上次更新时间]，取令牌时才按经过的时间补充（惰性补充）。
+    每隔 evict_interval 秒清理超过 evict_interval 秒未使用的桶（早已补满，与新建的桶等价），
+    键数量超过 max_keys 时提前清理，仍超出则丢弃最早加入的桶。多进程部署时每个进程各自计数。
+    """
+    
+    def __init__(self, max_keys=100000, evict_interval=60):
+        self.max_keys = max_keys
+        self.evict_interval = evict_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_evict = time.monotonic() + evict_interval
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst, cost=1):
+        """取 cost 个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._evict(now)
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            
+            if now >= self._next_evict:
+                self._evict(now)
+            
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / rate
+    
+    def _evict(self, now):
+        # 需在持有锁时调用
+        self._next_evict = now + self.evict_interval
+        idle = [key for key, (tokens, updated) in self._buckets.items()
+                if now - updated >= self.evict_interval]
+        for key in idle:
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+    
+    def __len__(self):
+        return len(self._buckets)
+
+# 在 Redis 中原子地完成补充与扣减，时间取 Redis 服务器时间，不受各应用服务器时钟偏差影响
+_REDIS_TAKE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisTokenBuckets:
+    """多进程/多服务器共享的令牌桶，需要安装 redis 包
+    
+    Redis 不可用时放行请求（只记录警告），限流不应导致验证服务不可用。
+    """
+    
+    def __init__(self, url, prefix='kami:ratelimit:'):
+        if redis is None:
+            raise ImportError("RATE_LIMIT_STORAGE_URL 使用 Redis 时需要安装 redis 包")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self._warned_at = 0.0
+    
+    def take(self, key, rate, burst, cost=1):
+        try:
+            allowed, tokens = self._take(keys=[self.prefix + key], args=[rate, burst, cost])
+        except redis.RedisError as e:
+            now = time.monotonic()
+            if now - self._warned_at >= 60:
+                self._warned_at = now
+                logger.warning(f"限流存储不可用，暂不限流: {str(e)}")
+            return True, 0.0
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+    
+    def __len__(self):
+        return 0
+
+def create_store(url='', max_keys=100000):
+    """按 RATE_LIMIT_STORAGE_URL 创建令牌桶存储，为空或 memory:// 时使用进程内存储"""
+    if url and not url.startswith('memory://'):
+        try:
+            return RedisTokenBuckets(url)
+        except ImportError as e:
+            logger.warning(f"{str(e)}，改用进程内限流")
+    return MemoryTokenBuckets(max_keys=max_keys)
+
+class RateLimiter:
+    """按客户端 IP 与机器码限流
+    
+    ip_rate/machine_rate 为每秒补充的令牌数，ip_burst/machine_burst 为桶容量（允许的突发请求数）。
+    默认不启用，由 RATE_LIMIT_ENABLED 开启。只作用于 Flask 的 api 蓝图，ASGI 验证服务（asgi_api.py）不限流。
+    """
+    
+    def __init__(self, store=None):
+        self.enabled = False
+        self.store = store or MemoryTokenBuckets()
+        self.ip_rate, self.ip_burst = 20.0, 40
+        self.machine_rate, self.machine_burst = 2.0, 10
+    
+    def init_app(self, app):
+        """从应用配置读取限流参数与存储"""
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', False)
+        self.ip_rate = app.config.get('RATE_LIMIT_IP_RATE', 20.0)
+        self.ip_burst = app.config.get('RATE_LIMIT_IP_BURST', 40)
+        self.machine_rate = app.config.get('RATE_LIMIT_MACHINE_RATE', 2.0)
+        self.machine_burst = app.config.get('RATE_LIMIT_MACHINE_BURST', 10)
+        self.store = create_store(app.config.get('RATE_LIMIT_STORAGE_URL', ''),
+                                  app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    
+    def check(self, ip, machine_code=None, cost=1):
+        """请求被限流时返回建议的 Retry-After 秒数（整数），允许时返回 None
+        
+        cost 为本次请求消耗的 IP 令牌数（如批量验证的卡密数量），不超过桶容量。
+        """
+        if not self.enabled:
+            return None
+        if ip:
+            allowed, retry_after = self.store.take('ip:' + ip, self.ip_rate, self.ip_burst,
+                                                   min(cost, self.ip_burst))
+            if not allowed:
+                RATE_LIMITED.labels('ip').inc()
+                return max(1, math.ceil(retry_after))
+        if machine_code:
+            allowed, retry_after = self.store.take('mc:' + machine_code, self.machine_rate, self.machine_burst)
+            if not allowed:
+                RATE_LIMITED.labels('machine').inc()
+                return max(1, math.ceil(retry_after))
+        return None
+    
+    def stats(self):
+        """限流配置与当前进程中的令牌桶数量（Redis 存储时为 0）"""
+        return {
+            'enabled': self.enabled,
+            'store': type(self.store).__name__,
+            'keys': len(self.store),
+            'ip_rate': self.ip_rate,
+            'ip_burst': self.ip_burst,
+            'machine_rate': self.machine_rate,
+            'machine_burst': self.machine_burst
+        }
+
+# 全局限流器
+rate_limiter = RateLimiter()
@@ -0,0 +1,189 @@
+from flask import current_app
+from models import db, Card, CardSearchGram, CardMachineGram
+from utils.stats import card_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+# n-gram 长度，搜索词短于该长度时不使用 n-gram 索引
+GRAM_SIZE = 3
+
+# 搜索时最多用于取候选卡密的 n-gram 数量
+MAX_QUERY_GRAMS = 3
+
+def ngram_enabled():
+    """是否启用 n-gram 索引"""
+    return current_app.config.get('SEARCH_NGRAM_ENABLED', False)
+
+def code_grams(text):
+    """拆分卡密代码（或机器码）为去重后的 n-gram 集合"""
+    text = text.upper()
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+def _spread(grams):
+    """按在搜索词中的位置分散地取最多 MAX_QUERY_GRAMS 个 n-gram（首、尾、中间）"""
+    if len(grams) <= MAX_QUERY_GRAMS:
+        return grams
+    step = (len(grams) - 1) / (MAX_QUERY_GRAMS - 1)
+    return [grams[round(i * step)] for i in range(MAX_QUERY_GRAMS)]
+
+def machine_grams(term):
+    """从搜索词中选出用于取机器码候选卡密的 n-gram，搜索词短于 n-gram 长度时返回空列表"""
+    text = term.upper()
+    grams = []
+    for i in range(len(text) - GRAM_SIZE + 1):
+        gram = text[i:i + GRAM_SIZE]
+        if gram not in grams:
+            grams.append(gram)
+    return _spread(grams)
+
+def selective_grams(term, prefixes):
+    """从搜索词中选出用于取候选卡密的 n-gram
+    
+    前缀在同一批卡密中完全相同，来自前缀（以及跨越 '-' 的）n-gram 几乎匹配该前缀下的所有卡密，
+    取交集前要读取大量索引行，因此跳过；其余 n-gram 来自随机代码，每个只匹配很少的卡密，
+    按在搜索词中的位置分散地取最多 MAX_QUERY_GRAMS 个（首、尾、中间）。没有可用的 n-gram 时返回空列表。
+    """
+    common = set()
+    for prefix in prefixes:
+        common |= code_grams(f"{prefix}-")
+    text = term.upper()
+    grams = []
+    for i in range(len(text) - GRAM_SIZE + 1):
+        gram = text[i:i + GRAM_SIZE]
+        if '-' not in gram and gram not in common and gram not in grams:
+            grams.append(gram)
+    return _spread(grams)
+
+def _insert_grams(pairs, model=CardSearchGram):
+    """为 (card_id, 文本) 列表写入 n-gram 行，文本为空的跳过"""
+    rows = [
+        {'gram': gram, 'card_id': card_id}
+        for card_id, text in pairs if text
+        for gram in code_grams(text)
+    ]
+    if rows:
+        db.session.execute(db.insert(model), rows)
+
+def machine_index_statement(full_code, machine_code):
+    """为刚激活的卡密写入机器码 n-gram 的语句（INSERT ... SELECT，按 full_code 取卡密主键），
+    机器码短于 n-gram 长度时返回 None
+    
+    与 Card.activation_statement 在同一事务中执行，同步接口与异步服务共用此语句。
+    """
+    grams = sorted(code_grams(machine_code))
+    if not grams:
+        return None
+    gram_rows = db.union_all(*(db.select(db.literal(gram, db.String).label('gram')) for gram in grams)).subquery()
+    source = (
+        db.select(gram_rows.c.gram, Card.id)
+        .select_from(gram_rows)
+        .join(Card, db.true())
+        .where(Card.full_code == full_code)
+    )
+    return db.insert(CardMachineGram).from_select(['gram', 'card_id'], source)
+
+def index_machine_code(full_code, machine_code):
+    """卡密激活后为绑定的机器码建立 n-gram 索引，由调用方提交事务"""
+    if not ngram_enabled():
+        return
+    statement = machine_index_statement(full_code, machine_code)
+    if statement is not None:
+        db.session.execute(statement)
+
+def index_codes(full_codes):
+    """为新生成的卡密建立 n-gram 索引，由调用方提交事务"""
+    if not ngram_enabled() or not full_codes:
+        return
+    pairs = db.session.execute(
+        db.select(Card.id, Card.full_code).where(Card.full_code.in_(full_codes))
+    ).all()
+    _insert_grams(pairs)
+
+def reindex_card(card_id, full_code):
+    """卡密代码变化后重建该卡密的 n-gram 索引，由调用方提交事务"""
+    if not ngram_enabled():
+        return
+    remove_card(card_id)
+    _insert_grams([(card_id, full_code)])
+
+def remove_card(card_id):
+    """删除卡密（含机器码）的 n-gram 索引，由调用方提交事务"""
+    if not ngram_enabled():
+        return
+    db.session.execute(db.delete(CardSearchGram).where(CardSearchGram.card_id == card_id))
+    db.session.execute(db.delete(CardMachineGram).where(CardMachineGram.card_id == card_id))
+
+def rebuild_search_index(batch_size=1000):
+    """全量重建卡密代码与机器码的 n-gram 索引，启用 SEARCH_NGRAM_ENABLED 前需执行一次"""
+    db.session.execute(db.delete(CardSearchGram))
+    db.session.execute(db.delete(CardMachineGram))
+    db.session.commit()
+    
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Card.id, Card.full_code, Card.machine_code)
+            .where(Card.id > last_id)
+            .order_by(Card.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        _insert_grams([(row.id, row.full_code) for row in rows])
+        _insert_grams([(row.id, row.machine_code) for row in rows], CardMachineGram)
+        db.session.commit()
+        indexed += len(rows)
+        last_id = rows[-1].id
+        logger.info(f"已重建搜索索引 {indexed} 个卡密")
+    
+    return indexed
+
+def _candidate_ids(model, grams):
+    """包含全部 n-gram 的卡密主键"""
+    return (
+        db.select(model.card_id)
+        .where(model.gram.in_(grams))
+        .group_by(model.card_id)
+        .having(db.func.count(model.gram) == len(grams))
+    )
+
+def apply_search(query, term):
+    """为卡密查询添加搜索条件，按子串匹配卡密代码或机器码
+    
+    不论数据量与是否启用 n-gram 索引，匹配结果都与 LIKE '%词%' 相同，只是取候选卡密的方式不同:
+    - 数据量小于 SEARCH_NGRAM_MIN_ROWS、未启用 n-gram 索引或搜索词短于 n-gram 长度时直接使用 LIKE '%词%'，
+      短搜索词匹配的卡密很多，按主键分页扫描很快就能取满一页；
+    - 搜索词包含随机代码部分时，用其中几个选择性高的 n-gram（见 selective_grams）取交集得到候选卡密，
+      机器码用 card_machine_grams 中的 n-gram 取候选卡密，再用 LIKE 校验；
+    - 搜索词只包含前缀部分时匹配的卡密很多，卡密代码直接使用 LIKE '%词%'。
+    """
+    term = term.strip()
+    if not term:
+        return query
+    
+    min_rows = current_app.config.get('SEARCH_NGRAM_MIN_ROWS', 100000)
+    if not ngram_enabled() or len(term) < GRAM_SIZE or card_stats.count_for() < min_rows:
+        return query.filter(db.or_(
+            Card.full_code.contains(term, autoescape=True),
+            Card.machine_code.contains(term, autoescape=True)
+        ))
+    
+    machine_ids = db.select(Card.id).where(
+        Card.id.in_(_candidate_ids(CardMachineGram, machine_grams(term))),
+        Card.machine_code.contains(term, autoescape=True)
+    ).correlate(None)
+    
+    grams = selective_grams(term, card_stats.get_prefixes())
+    if not grams:
+        return query.filter(db.or_(
+            Card.full_code.contains(term, autoescape=True),
+            Card.id.in_(machine_ids)
+        ))
+    
+    code_ids = db.select(Card.id).where(
+        Card.id.in_(_candidate_ids(CardSearchGram, grams)),
+        Card.full_code.contains(term, autoescape=True)
+    ).correlate(None)
+    return query.filter(Card.id.in_(db.union(code_ids, machine_ids)))
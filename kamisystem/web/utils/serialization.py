@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+from flask.json.provider import DefaultJSONProvider
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 上海自 1991 年起不再实行夏令时，固定 UTC+8 偏移与 Asia/Shanghai 时区规则结果一致，
+# 转换时无需像 pytz 那样查找时区转换表
+SHANGHAI_OFFSET = timedelta(hours=8)
+SHANGHAI_TZ = timezone(SHANGHAI_OFFSET, 'Asia/Shanghai')
+
+def now_shanghai():
+    """当前上海时间"""
+    return datetime.now(SHANGHAI_TZ)
+
+def to_shanghai(dt):
+    """将数据库中的 UTC 时间（不带时区）转换为上海时间，带时区的时间直接换算"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return (dt + SHANGHAI_OFFSET).replace(tzinfo=SHANGHAI_TZ)
+    return dt.astimezone(SHANGHAI_TZ)
+
+def shanghai_isoformat(dt):
+    """UTC 时间转换为上海时区的 ISO 格式字符串，如 2024-01-01T08:00:00+08:00"""
+    if dt is None:
+        return None
+    return to_shanghai(dt).isoformat()
+
+def dumps(obj):
+    """序列化为 UTF-8 JSON 字节串，安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用的 JSON 编码器，安装了 orjson 时用 orjson 编码
+    
+    日期等 orjson 不直接处理的类型仍按 Flask 默认规则转换，键的排序同样遵循 sort_keys。
+    """
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj).decode('utf-8')
+    
+    def _orjson_dumps(self, obj):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+    
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj), mimetype=self.mimetype)
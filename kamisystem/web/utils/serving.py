@@ -0,0 +1,60 @@
+from collections import namedtuple
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 生产环境的进程/线程模型与数据库连接池参数
+ServingConfig = namedtuple('ServingConfig', [
+    'workers', 'threads', 'pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'
+])
+
+def _int_env(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def load_serving_config(environ=None):
+    """从环境变量读取并校正服务参数
+    
+    WEB_WORKERS      工作进程数，默认等于 CPU 核数
+    WEB_THREADS      每个进程的线程数，默认 4
+    DB_POOL_SIZE     每个进程的数据库连接池大小，不会小于线程数
+    DB_MAX_OVERFLOW  连接池允许的临时连接数，默认 0
+    DB_POOL_TIMEOUT  等待空闲连接的秒数，默认 20
+    DB_POOL_RECYCLE  连接回收时间（秒），默认 300
+    
+    每个线程同一时间最多占用一个连接，连接池小于线程数时多出的线程只能排队等待连接，
+    因此连接池大小至少取线程数。
+    """
+    environ = os.environ if environ is None else environ
+    
+    workers = max(_int_env(environ, 'WEB_WORKERS', os.cpu_count() or 1), 1)
+    threads = max(_int_env(environ, 'WEB_THREADS', 4), 1)
+    pool_size = _int_env(environ, 'DB_POOL_SIZE', threads)
+    if pool_size < threads:
+        logger.warning(f"DB_POOL_SIZE={pool_size} 小于 WEB_THREADS={threads}，已调整为 {threads}")
+        pool_size = threads
+    
+    return ServingConfig(
+        workers=workers,
+        threads=threads,
+        pool_size=pool_size,
+        max_overflow=max(_int_env(environ, 'DB_MAX_OVERFLOW', 0), 0),
+        pool_timeout=_int_env(environ, 'DB_POOL_TIMEOUT', 20),
+        pool_recycle=_int_env(environ, 'DB_POOL_RECYCLE', 300)
+    )
+
+def engine_options(config):
+    """生成 SQLALCHEMY_ENGINE_OPTIONS"""
+    return {
+        'pool_pre_ping': True,
+        'pool_size': config.pool_size,
+        'max_overflow': config.max_overflow,
+        'pool_timeout': config.pool_timeout,
+        'pool_recycle': config.pool_recycle
+    }
+
+def scheduler_enabled(environ=None):
+    """是否在当前部署中运行定时任务，多台服务器共用数据库时只需在一台上开启"""
+    environ = os.environ if environ is None else environ
+    return environ.get('ENABLE_SCHEDULER', 'True').lower() == 'true'
@@ -0,0 +1,106 @@
+from utils.metrics import metrics
+import asyncio
+import os
+import threading
+
+SINGLE_FLIGHT_CALLS = metrics.counter(
+    'kami_single_flight_calls_total', '实际执行的调用数量（每组合并请求中执行查询的那一个）', ('flight',))
+SINGLE_FLIGHT_COALESCED = metrics.counter(
+    'kami_single_flight_coalesced_total', '等待同一个进行中调用的结果、未自行执行的请求数量', ('flight',))
+
+class _Call:
+    """一次进行中的调用"""
+    
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """进程内的请求合并（single-flight）
+    
+    同一 key 的调用正在执行时，后到的调用不再执行，等待并共用它的结果（或异常）；
+    调用结束后下一个请求重新执行。do 用于线程（Flask），do_async 用于同一事件循环中的协程（ASGI），
+    两者分别合并。返回 (结果, 是否共用了其他请求的结果)，结果在请求之间共享，不应修改。
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self.enabled = True
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def init_app(self, app):
+        """从应用配置读取是否启用"""
+        self.enabled = app.config.get('SINGLE_FLIGHT_ENABLED', True)
+    
+    def _record(self, shared):
+        if shared:
+            self.coalesced += 1
+            SINGLE_FLIGHT_COALESCED.labels(self.name).inc()
+        else:
+            self.executed += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name).inc()
+    
+    def do(self, key, func):
+        """执行 func()，同一 key 已有线程在执行时等待它的结果"""
+        if not self.enabled:
+            return func(), False
+        
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+        self._record(shared)
+        
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+    
+    async def do_async(self, key, func):
+        """await func()，同一 key 已有协程在执行时等待它的结果"""
+        if not self.enabled:
+            return await func(), False
+        
+        task = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._tasks[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        self._record(shared)
+        # 某个请求被取消（客户端断开）时不影响其他等待同一结果的请求
+        return await asyncio.shield(task), shared
+    
+    def stats(self):
+        """当前进程的执行与合并次数"""
+        return {
+            'enabled': self.enabled,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls) + len(self._tasks)
+        }
@@ -0,0 +1,164 @@
+from models import db, Card, CardStatus, get_utc_time
+from utils.db_routing import replica_reads
+import os
+import threading
+import time
+
+class CardStats:
+    """卡密统计服务
+    
+    用一条 GROUP BY status, prefix 聚合查询得到全部计数，并在短时间内缓存结果。
+    开启增量模式后，激活/生成/过期/编辑/删除事件会直接修正缓存中的计数，
+    只按较长的间隔重新查询校准，管理后台刷新页面时不再扫描卡密表。
+    增量只作用于当前进程，其他进程的修改在下一次校准时生效。
+    
+    非增量模式按实际状态计数，已到期但尚未被后台标记的激活卡密计入已过期；
+    增量模式按存储的状态计数，激活→过期只由过期清理与过期调度器的 record_expired 计入，
+    避免同一张卡密在查询与增量中各计一次。
+    """
+    
+    def __init__(self, ttl=10, incremental=False, reconcile_interval=300):
+        self.ttl = ttl
+        self.incremental = incremental
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        self._status_counts = None
+        self._prefix_counts = None
+        self._group_counts = None
+        self._loaded_at = 0
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """从应用配置读取缓存参数"""
+        self.ttl = app.config.get('STATS_CACHE_TTL', 10)
+        self.incremental = app.config.get('STATS_INCREMENTAL', False)
+        self.reconcile_interval = app.config.get('STATS_RECONCILE_INTERVAL', 300)
+        self.invalidate()
+    
+    def _load(self):
+        """执行聚合查询
+        
+        非增量模式下已到期但尚未被后台标记的激活卡密计入已过期（见类说明）。配置从库时在从库上执行。
+        """
+        columns = [Card.status, Card.prefix]
+        if not self.incremental:
+            columns.append(db.case(
+                (db.and_(Card.status == CardStatus.ACTIVE, Card.expire_at < get_utc_time()), 1),
+                else_=0
+            ).label('overdue'))
+        with replica_reads():
+            rows = db.session.execute(
+                db.select(*columns, db.func.count(Card.id)).group_by(*columns)
+            ).all()
+        
+        status_counts = {status.value: 0 for status in CardStatus}
+        prefix_counts = {}
+        group_counts = {}
+        for status, prefix, *overdue, count in rows:
+            if overdue and overdue[0]:
+                status = CardStatus.EXPIRED
+            status_counts[status.value] += count
+            prefix_counts[prefix] = prefix_counts.get(prefix, 0) + count
+            group_counts[(status.value, prefix)] = group_counts.get((status.value, prefix), 0) + count
+        return status_counts, prefix_counts, group_counts
+    
+    def _ensure_loaded(self):
+        """缓存过期时重新查询"""
+        max_age = self.reconcile_interval if self.incremental else self.ttl
+        if self._status_counts is not None and time.monotonic() - self._loaded_at < max_age:
+            return
+        status_counts, prefix_counts, group_counts = self._load()
+        with self._lock:
+            self._status_counts = status_counts
+            self._prefix_counts = prefix_counts
+            self._group_counts = group_counts
+            self._loaded_at = time.monotonic()
+    
+    def get_stats(self):
+        """获取总数、各状态数量和前缀数量"""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                'total': sum(self._status_counts.values()),
+                'unused': self._status_counts[CardStatus.UNUSED.value],
+                'active': self._status_counts[CardStatus.ACTIVE.value],
+                'expired': self._status_counts[CardStatus.EXPIRED.value],
+                'prefixes': len(self._prefix_counts)
+            }
+    
+    def get_prefixes(self):
+        """获取所有前缀"""
+        self._ensure_loaded()
+        with self._lock:
+            return sorted(self._prefix_counts)
+    
+    def count_for(self, status=None, prefix=None):
+        """获取按状态和前缀筛选后的数量
+        
+        同时按状态和前缀筛选时来自最近一次聚合查询，增量事件不会修正，结果为近似值。
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if status and prefix:
+                return self._group_counts.get((status.value, prefix), 0)
+            if status:
+                return self._status_counts[status.value]
+            if prefix:
+                return self._prefix_counts.get(prefix, 0)
+            return sum(self._status_counts.values())
+    
+    def invalidate(self):
+        """丢弃缓存，下次读取时重新查询"""
+        with self._lock:
+            self._status_counts = None
+            self._prefix_counts = None
+    
+    def _apply(self, status=None, status_delta=0, prefix=None, prefix_delta=0):
+        """增量修正缓存中的计数"""
+        if not self.incremental:
+            return
+        with self._lock:
+            if self._status_counts is None:
+                return
+            if status is not None:
+                self._status_counts[status.value] = max(self._status_counts[status.value] + status_delta, 0)
+            if prefix is not None:
+                count = self._prefix_counts.get(prefix, 0) + prefix_delta
+                if count > 0:
+                    self._prefix_counts[prefix] = count
+                else:
+                    self._prefix_counts.pop(prefix, None)
+    
+    def record_generated(self, prefix, count):
+        """记录新生成的卡密"""
+        self._apply(CardStatus.UNUSED, count, prefix, count)
+    
+    def record_activated(self, count=1):
+        """记录卡密激活"""
+        self._apply(CardStatus.UNUSED, -count)
+        self._apply(CardStatus.ACTIVE, count)
+    
+    def record_expired(self, count=1):
+        """记录卡密过期（存储的状态由激活改为过期的数量）"""
+        self._apply(CardStatus.ACTIVE, -count)
+        self._apply(CardStatus.EXPIRED, count)
+    
+    def record_deleted(self, prefix, status):
+        """记录卡密删除"""
+        self._apply(status, -1, prefix, -1)
+    
+    def record_changed(self, old_prefix, old_status, new_prefix, new_status):
+        """记录卡密前缀或状态的修改"""
+        if old_status != new_status:
+            self._apply(old_status, -1)
+            self._apply(new_status, 1)
+        if old_prefix != new_prefix:
+            self._apply(prefix=old_prefix, prefix_delta=-1)
+            self._apply(prefix=new_prefix, prefix_delta=1)
+
+# 全局统计实例
+card_stats = CardStats()
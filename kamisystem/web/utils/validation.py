@@ -0,0 +1,169 @@
+from models import CardStatus, effective_status
+from utils.card_cache import card_cache
+from utils.serialization import shanghai_isoformat
+from utils.metrics import VALIDATE_LATENCY
+from utils.license_token import license_signer
+from utils.single_flight import SingleFlight
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 当前验证请求的开始时间，record() 据此按结果记录请求耗时
+_validation_started = ContextVar('validation_started', default=None)
+
+# 卡密验证规则，Flask 接口与异步服务共用
+
+class ValidationOutcomes:
+    """按结果分类的验证计数
+    
+    代替逐条请求日志：每隔 log_interval 秒输出一行汇总，
+    另按 sample_rate 的比例抽样输出单条请求的详情（默认不抽样）。
+    """
+    
+    OUTCOMES = ('success', 'cache_hit', 'activated', 'mismatch', 'expired',
+                'not_found', 'invalid', 'conflict', 'error')
+    
+    def __init__(self, log_interval=60, sample_rate=0.0):
+        self.log_interval = log_interval
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(self.OUTCOMES, 0)
+        self._window = dict.fromkeys(self.OUTCOMES, 0)
+        self._window_started = time.monotonic()
+    
+    def init_app(self, app):
+        """从应用配置读取汇总间隔与抽样比例"""
+        self.log_interval = app.config.get('VALIDATION_LOG_INTERVAL', 60)
+        self.sample_rate = app.config.get('VALIDATION_LOG_SAMPLE_RATE', 0.0)
+    
+    @contextmanager
+    def timed(self):
+        """在此范围内记录的验证结果同时计入耗时直方图，也可以作为装饰器: @validation_outcomes.timed()"""
+        token = _validation_started.set(time.perf_counter())
+        try:
+            yield
+        finally:
+            _validation_started.reset(token)
+    
+    def record(self, outcome, code=None, detail=''):
+        """记录一次验证结果"""
+        started = _validation_started.get()
+        if started is not None:
+            VALIDATE_LATENCY.labels(outcome).observe(time.perf_counter() - started)
+        
+        summary = None
+        now = time.monotonic()
+        with self._lock:
+            self._totals[outcome] += 1
+            self._window[outcome] += 1
+            if self.log_interval and now - self._window_started >= self.log_interval:
+                summary = (now - self._window_started, self._window)
+                self._window = dict.fromkeys(self.OUTCOMES, 0)
+                self._window_started = now
+        
+        if self.sample_rate and random.random() < self.sample_rate:
+            logger.info("验证结果(抽样): %s %s %s", outcome, code, detail)
+        if summary:
+            elapsed, counts = summary
+            logger.info("验证统计(%.0f秒): %s", elapsed,
+                        ', '.join(f"{name}={count}" for name, count in counts.items() if count))
+    
+    def stats(self):
+        """进程启动以来各结果的累计数量"""
+        with self._lock:
+            return dict(self._totals)
+
+# 全局验证结果计数
+validation_outcomes = ValidationOutcomes()
+
+# 同一卡密的并发验证共用一次数据库激活/查询
+validation_flight = SingleFlight('validate')
+
+def success_payload(expire_at, now, expire_at_iso=None, token_for=None):
+    """构造授权成功的响应数据，expire_at_iso 为预先格式化好的过期时间（来自缓存）
+    
+    token_for 为 (卡密, 机器码) 时附带离线授权令牌 license_token（需配置签名密钥）。
+    """
+    remaining_hours = (expire_at - now).total_seconds() / 3600
+    
+    payload = {
+        'status': 'success',
+        'message': '授权成功',
+        'expire_at': expire_at_iso or shanghai_isoformat(expire_at),
+        'remaining_hours': round(remaining_hours, 2)
+    }
+    if token_for:
+        token = license_signer.issue(*token_for, expire_at)
+        if token:
+            payload['license_token'] = token
+    return payload
+
+def check_card(code, machine_code, status, bound_machine_code, expire_at, now, token=False):
+    """根据已存在卡密的状态快照判断验证结果，返回 (响应数据, HTTP状态码)
+    
+    已到期但尚未被后台标记的激活卡密按过期处理，判断过程不写数据库。
+    token 为 True 时成功响应附带离线授权令牌。
+    """
+    if status == CardStatus.ACTIVE:
+        # 检查机器码是否匹配
+        if bound_machine_code != machine_code:
+            validation_outcomes.record('mismatch', code, machine_code)
+            return {'status': 'error', 'message': '机器码不匹配'}, 403
+        
+        # 检查是否过期
+        if expire_at is not None and now > expire_at:
+            validation_outcomes.record('expired', code)
+            return {'status': 'error', 'message': '卡密已过期'}, 403
+        
+        validation_outcomes.record('success', code)
+        return success_payload(expire_at, now, token_for=(code, machine_code) if token else None), 200
+    
+    elif status == CardStatus.EXPIRED:
+        validation_outcomes.record('expired', code)
+        return {'status': 'error', 'message': '卡密已过期'}, 403
+    
+    elif status == CardStatus.UNUSED:
+        # 条件更新未命中但读到未使用状态，说明卡密在两次语句之间被修改
+        logger.warning("卡密激活冲突: %s", code)
+        validation_outcomes.record('conflict', code)
+        return {'status': 'error', 'message': '卡密激活失败'}, 500
+    
+    validation_outcomes.record('error', code, status)
+    return {'status': 'error', 'message': '未知的卡密状态'}, 500
+
+def check_cached(code, machine_code, now, token=False):
+    """已激活且机器码一致的卡密直接由缓存应答，未命中返回 None"""
+    cached = card_cache.get(code)
+    if cached and cached.status == CardStatus.ACTIVE.value and cached.machine_code == machine_code \
+            and cached.expire_at > now:
+        validation_outcomes.record('cache_hit', code)
+        return success_payload(cached.expire_at, now, cached.expire_at_iso,
+                               token_for=(code, machine_code) if token else None)
+    return None
+
+def status_payload(full_code, status, created_at, used_at, expire_at, machine_code, now):
+    """构造卡密状态查询的响应数据，状态为读取时计算的实际状态"""
+    status = effective_status(status, expire_at, now)
+    result = {
+        'status': 'success',
+        'data': {
+            'full_code': full_code,
+            'status': status.value,
+            'created_at': shanghai_isoformat(created_at),
+            'used_at': shanghai_isoformat(used_at),
+            'expire_at': shanghai_isoformat(expire_at),
+            'machine_code': machine_code
+        }
+    }
+    
+    # 如果是活跃状态，添加剩余时间信息
+    if status == CardStatus.ACTIVE and expire_at:
+        remaining_time = expire_at - now
+        result['data']['remaining_hours'] = round(remaining_time.total_seconds() / 3600, 2)
+    
+    return result
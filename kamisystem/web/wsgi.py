@@ -0,0 +1,11 @@
+"""
+生产环境 WSGI 入口
+    
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+进程数、线程数与连接池大小见 gunicorn.conf.py 与 utils/serving.py。
+"""
+
+from app import create_app
+
+app = create_app()